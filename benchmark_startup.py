@@ -0,0 +1,80 @@
+'''
+冷啟動時間量測
+
+每次都以新的 Python 行程量測：
+    1. 匯入各模組所需時間
+    2. 以 Streamlit AppTest 執行首頁直到第一次畫面輸出（尚未上傳檔案）
+
+用法：python benchmark_startup.py [--runs 5] [--max-first-paint 3.0]
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "matplotlib": "matplotlib" in sys.modules}}))
+'''
+
+FIRST_PAINT_PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("final_schedule.py", default_timeout=60).run()
+print(json.dumps({"seconds": time.perf_counter() - start, "matplotlib": "matplotlib" in sys.modules,
+                  "exceptions": len(at.exception)}))
+'''
+
+BENCHMARKS = [
+    ('import schedule_engine', IMPORT_PROBE.format(module='schedule_engine')),
+    ('import timetable_export', IMPORT_PROBE.format(module='timetable_export')),
+    ('import final_schedule', IMPORT_PROBE.format(module='final_schedule')),
+    ('first paint', FIRST_PAINT_PROBE),
+]
+
+
+def run_probe(code):
+    """在新的行程執行量測程式，回傳最後一行的 JSON 結果"""
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='量測排課系統冷啟動時間')
+    parser.add_argument('--runs', type=int, default=5, help='每項量測的重複次數（取中位數）')
+    parser.add_argument('--max-first-paint', type=float, default=None,
+                        help='首次畫面輸出的時間上限（秒），超過時以非零狀態結束')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'項目':<26}{'中位數(秒)':>12}{'最快(秒)':>12}  matplotlib")
+    for label, code in BENCHMARKS:
+        results = [run_probe(code) for _ in range(args.runs)]
+        seconds = [r['seconds'] for r in results]
+        median = statistics.median(seconds)
+        loaded = any(r['matplotlib'] for r in results)
+        print(f"{label:<26}{median:>12.3f}{min(seconds):>12.3f}  {'已載入' if loaded else '未載入'}")
+
+        if label == 'first paint':
+            if any(r['exceptions'] for r in results):
+                print("首頁執行時發生例外")
+                failed = True
+            if args.max_first_paint is not None and median > args.max_first_paint:
+                print(f"首次畫面輸出 {median:.3f} 秒，超過上限 {args.max_first_paint} 秒")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1889 @@
+"""
+排課引擎：課程資料讀取、教師可用時間、遺傳演算法與衝突檢查
+
+只匯入排課所需的套件，不依賴 Streamlit；進度與警告訊息透過 reporter 輸出
+（Streamlit 介面傳入 st 模組，命令列與工作行程預設寫入 logging），
+子行程平行求解時不會載入介面與繪圖套件
+"""
+
+import logging
+import pandas as pd
+import numpy as np
+import random
+import time
+import os
+import json
+import hashlib
+import multiprocessing
+import pickle
+import tempfile
+from collections import defaultdict, OrderedDict
+from functools import partial
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# 課程資料欄位：必要欄位缺少時無法排課，其餘欄位缺少時以預設值補齊
+REQUIRED_COURSE_COLUMNS = ['班級', '科目代碼', '科目名稱', '時數', '授課教師']
+OPTIONAL_COURSE_COLUMNS = {
+    '系所': '', '組別': None, '修選別': 0, '星期': None, '節數': None, '課程安排方式': 0,
+    '人數': 0, '教室需求': None
+}
+COURSE_COLUMNS = ['系所', '班級', '科目代碼', '科目名稱', '組別', '修選別',
+                  '時數', '授課教師', '星期', '節數', '課程安排方式', '人數', '教室需求']
+
+# 各系所常見的欄位別名
+COURSE_COLUMN_ALIASES = {
+    '系所': ['系所', '系別', '開課系所', '開課單位'],
+    '班級': ['班級', '班別', '開課班級', '上課班級'],
+    '科目代碼': ['科目代碼', '課程代碼', '課號', '科目代號', '課程代號'],
+    '科目名稱': ['科目名稱', '課程名稱', '科目', '課程'],
+    '組別': ['組別', '分組', '組'],
+    '修選別': ['修選別', '必選修', '必選修別', '選別'],
+    '時數': ['時數', '每週時數', '授課時數', '上課時數'],
+    '授課教師': ['授課教師', '教師', '任課教師', '教師姓名', '老師'],
+    '星期': ['星期', '上課星期', '星期別'],
+    '節數': ['節數', '節次', '上課節次', '上課節數'],
+    '課程安排方式': ['課程安排方式', '安排方式', '排課方式'],
+    '人數': ['人數', '修課人數', '選課人數', '學生人數'],
+    '教室需求': ['教室需求', '教室設備', '設備需求'],
+}
+
+# 教室清單欄位別名
+ROOM_COLUMN_ALIASES = {
+    '教室': ['教室', '教室名稱', '教室代碼', '教室編號'],
+    '容量': ['容量', '座位數', '人數上限', '容納人數'],
+    '設備': ['設備', '教室設備', '特殊設備'],
+}
+
+# 依序嘗試的檔案編碼
+COURSE_FILE_ENCODINGS = ['utf-8-sig', 'cp950', 'big5']
+
+# 佔用張量的節次欄位順序
+PERIOD_ORDER = [1, 2, 3, 4, 'E', 5, 6, 7, 8, 9]
+WEEKDAYS = ['一', '二', '三', '四', '五']
+
+
+# 軟性限制核心：輸入 班級/教師 × 星期 × 節次 的佔用張量，回傳違反量
+def soft_daily_load(class_occ, teacher_occ, target='teacher', limit=6):
+    """每日節數超過上限的節數"""
+    occ = teacher_occ if target == 'teacher' else class_occ
+    return np.maximum(occ.sum(axis=2) - limit, 0).sum()
+
+
+def soft_gaps(class_occ, teacher_occ, target='class', ignore=('E',)):
+    """同一天第一節與最後一節課之間的空堂數；ignore 中的節次（預設為午休E節）不列入計算
+    
+    上午3、4節與下午5、6節之間空出午休不算空堂，空出第4節才算：
+    
+    >>> occ = np.zeros((1, 5, len(PERIOD_ORDER)), dtype=int)
+    >>> occ[0, 0, [PERIOD_ORDER.index(p) for p in (3, 4, 5, 6)]] = 1
+    >>> int(soft_gaps(occ, occ))
+    0
+    >>> occ[0, 0, PERIOD_ORDER.index(4)] = 0
+    >>> int(soft_gaps(occ, occ))
+    1
+    """
+    occupied = (teacher_occ if target == 'teacher' else class_occ) > 0
+    if ignore:
+        keep = [i for i, period in enumerate(PERIOD_ORDER) if period not in ignore]
+        occupied = occupied[:, :, keep]
+    if not occupied.size:
+        return 0
+    n_periods = occupied.shape[2]
+    has_class = occupied.any(axis=2)
+    first = occupied.argmax(axis=2)
+    last = n_periods - 1 - occupied[:, :, ::-1].argmax(axis=2)
+    span = np.where(has_class, last - first + 1, 0)
+    return (span - occupied.sum(axis=2)).sum()
+
+
+def soft_period_usage(class_occ, teacher_occ, period='E'):
+    """班級在指定節次有課的次數"""
+    return (class_occ[:, :, PERIOD_ORDER.index(period)] > 0).sum()
+
+
+def soft_day_spread(class_occ, teacher_occ, target='class'):
+    """每週各天節數的差距（最多與最少的天數差）"""
+    occ = teacher_occ if target == 'teacher' else class_occ
+    if not occ.size:
+        return 0
+    daily = occ.sum(axis=2)
+    return (daily.max(axis=1) - daily.min(axis=1)).sum()
+
+
+def soft_teaching_days(class_occ, teacher_occ, limit=3):
+    """教師每週到校授課天數超過上限的天數"""
+    days = (teacher_occ.sum(axis=2) > 0).sum(axis=1)
+    return np.maximum(days - limit, 0).sum()
+
+
+# 可插拔的軟性限制：名稱 → 說明、核心函式、預設權重、參數
+SOFT_CONSTRAINTS = {
+    'teacher_daily_load': {
+        'label': '教師每日授課不超過6節', 'kernel': soft_daily_load,
+        'weight': 5, 'params': {'target': 'teacher', 'limit': 6}},
+    'class_daily_load': {
+        'label': '班級每日上課不超過8節', 'kernel': soft_daily_load,
+        'weight': 5, 'params': {'target': 'class', 'limit': 8}},
+    'class_gaps': {
+        'label': '班級當日課程間不留空堂（午休不計）', 'kernel': soft_gaps,
+        'weight': 2, 'params': {'target': 'class', 'ignore': ('E',)}},
+    'teacher_gaps': {
+        'label': '教師當日課程間不留空堂（午休不計）', 'kernel': soft_gaps,
+        'weight': 1, 'params': {'target': 'teacher', 'ignore': ('E',)}},
+    'class_lunch': {
+        'label': '班級盡量保留午休（E節）', 'kernel': soft_period_usage,
+        'weight': 2, 'params': {'period': 'E'}},
+    'class_late': {
+        'label': '班級盡量不排第9節', 'kernel': soft_period_usage,
+        'weight': 1, 'params': {'period': 9}},
+    'class_day_spread': {
+        'label': '班級課程平均分散於各天', 'kernel': soft_day_spread,
+        'weight': 1, 'params': {'target': 'class'}},
+    'teacher_teaching_days': {
+        'label': '教師每週到校不超過3天', 'kernel': soft_teaching_days,
+        'weight': 0, 'params': {'limit': 3}},
+}
+
+class LogReporter:
+    """預設的訊息輸出，介面同 st.write / st.warning，寫入 logging"""
+    
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger('schedule_engine')
+    
+    def write(self, message):
+        self.logger.info(message)
+    
+    def warning(self, message):
+        self.logger.warning(message)
+
+
+# 教師可用時間的磁碟快取：以檔案內容雜湊為鍵，檔案內容改變時自動失效；
+# 存放於使用者自己的快取目錄，超過期限或總大小上限時刪除最久未使用的項目
+AVAILABILITY_CACHE_DIR = os.environ.get('SCHEDULE_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'departmental_helper', 'availability')
+AVAILABILITY_CACHE_VERSION = 1  # 解析規則改變時遞增，使舊快取失效
+AVAILABILITY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+AVAILABILITY_CACHE_MAX_AGE = 180 * 24 * 3600  # 約一學期（秒）
+
+
+def availability_cache_key(raw, kind):
+    """檔案內容（加上格式與快取版本）的 SHA-256 雜湊"""
+    digest = hashlib.sha256(f"{AVAILABILITY_CACHE_VERSION}:{kind}:".encode())
+    digest.update(raw)
+    return digest.hexdigest()
+
+
+def save_cached_availability(cache_dir, key, availability, report):
+    """將可用時間存為 教師 × 星期 × 節次 的 int8 陣列（-1 未填、0 不可用、1 可用）與 JSON 索引"""
+    teachers = list(availability)
+    periods = list(dict.fromkeys(
+        period for slots in availability.values() for day_slots in slots.values() for period in day_slots))
+    period_index = {period: i for i, period in enumerate(periods)}
+    
+    grid = np.full((len(teachers), len(WEEKDAYS), len(periods)), -1, dtype=np.int8)
+    for t, teacher in enumerate(teachers):
+        for d, day in enumerate(WEEKDAYS):
+            for period, available in availability[teacher].get(day, {}).items():
+                grid[t, d, period_index[period]] = 1 if available else 0
+    
+    meta = {
+        'teachers': teachers,
+        'periods': [p if isinstance(p, int) else str(p) for p in periods],
+        'report': report,
+    }
+    
+    # 先寫入暫存檔再更名，避免其他行程讀到寫到一半的快取
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    for suffix, write in (('.npy', lambda f: np.save(f, grid)),
+                          ('.json', lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))):
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=suffix)
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, os.path.join(cache_dir, key + suffix))
+
+
+def load_cached_availability(cache_dir, key):
+    """以記憶體映射讀取快取，回傳 (可用時間, 檢查報告)；沒有快取時回傳 None"""
+    try:
+        with open(os.path.join(cache_dir, key + '.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        grid = np.load(os.path.join(cache_dir, key + '.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    
+    # 更新修改時間，作為清理時「最近使用」的依據
+    for suffix in ('.npy', '.json'):
+        try:
+            os.utime(os.path.join(cache_dir, key + suffix))
+        except OSError:
+            pass
+    
+    periods = meta['periods']
+    availability = {}
+    for t, teacher in enumerate(meta['teachers']):
+        slots = {}
+        for d, day in enumerate(WEEKDAYS):
+            row = np.asarray(grid[t, d])
+            filled = np.flatnonzero(row >= 0)
+            if filled.size:
+                slots[day] = {periods[i]: bool(row[i]) for i in filled}
+        availability[teacher] = slots
+    return availability, meta['report']
+
+
+def prune_availability_cache(cache_dir, max_bytes=AVAILABILITY_CACHE_MAX_BYTES,
+                             max_age=AVAILABILITY_CACHE_MAX_AGE):
+    """刪除超過期限的快取，總大小仍超過上限時由最久未使用的項目開始刪除"""
+    entries = {}
+    for name in os.listdir(cache_dir):
+        key, suffix = os.path.splitext(name)
+        if suffix not in ('.npy', '.json'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        size, mtime = entries.get(key, (0, 0))
+        entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+    
+    now = time.time()
+    total = sum(size for size, _ in entries.values())
+    for key, (size, mtime) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        for suffix in ('.npy', '.json'):
+            try:
+                os.remove(os.path.join(cache_dir, key + suffix))
+            except OSError:
+                pass
+        total -= size
+
+
+class CourseScheduler:
+    def __init__(self, courses_df, teacher_files, fitness_cache_size=10000, soft_constraints=None,
+                 teacher_availability=None, verbose=True, availability_cache_dir=AVAILABILITY_CACHE_DIR,
+                 reporter=None):
+        self.courses_df = courses_df
+        self.teacher_files = teacher_files
+        self.verbose = verbose
+        self.reporter = reporter or LogReporter()
+        self.availability_cache_dir = availability_cache_dir
+        self.availability_cache_hits = 0
+        
+        # 節次對應時間
+        self.period_to_time = {
+            1: '08:10-09:00', 2: '09:10-10:00', 3: '10:10-11:00', 4: '11:10-12:00',
+            'E': '12:10-13:00', 5: '13:10-14:00', 6: '14:10-15:00', 
+            7: '15:10-16:00', 8: '16:10-17:00', 9: '17:10-18:00'
+        }
+        
+        # 星期對應
+        self.weekday_map = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4}
+        self.weekday_reverse = {0: '一', 1: '二', 2: '三', 3: '四', 4: '五'}
+        
+        # 讀取教師可用時間（子問題直接沿用已解析的結果）
+        if teacher_availability is None:
+            self.teacher_availability = self.load_teacher_availability()
+        else:
+            self.teacher_availability = teacher_availability
+            self.availability_report = []
+            self.availability_errors = []
+        
+        # 處理課程資料
+        self.process_courses()
+        
+        # 各課程符合教師可用時間的候選時段
+        self.teacher_slots_cache = {}
+        self.placement_units_cache = None
+        
+        # 建立佔用張量索引並編譯軟性限制
+        self.build_occupancy_index()
+        self.soft_constraint_overrides = soft_constraints
+        self.soft_constraints = self.compile_soft_constraints(soft_constraints)
+        
+        # 適應度快取（LRU，以染色體雜湊值為鍵）
+        self.fitness_cache = OrderedDict()
+        self.fitness_cache_size = fitness_cache_size
+        self.fitness_cache_hits = 0
+        self.fitness_cache_misses = 0
+        
+    def load_teacher_availability(self):
+        """載入所有教師的可用時間，內容未變的檔案直接讀取磁碟快取
+        
+        無法讀取的檔案記錄於 self.availability_errors，該檔案的教師視為全時段可用
+        """
+        availability = {}
+        self.availability_report = []
+        self.availability_errors = []
+        
+        for teacher_file in self.teacher_files:
+            is_workbook = teacher_file.name.lower().endswith('.xlsx')
+            raw = teacher_file.getvalue()
+            key = availability_cache_key(raw, 'xlsx' if is_workbook else 'csv')
+            cached = self.load_cached_file(key)
+            
+            if is_workbook:
+                if cached is None:
+                    report_start = len(self.availability_report)
+                    workbook_availability = self.load_availability_workbook(teacher_file, BytesIO(raw))
+                    report = self.availability_report[report_start:]
+                    if report:
+                        self.save_cached_file(key, workbook_availability, report)
+                else:
+                    # 快取只以內容為鍵，報告中的檔名改為本次上傳的檔名
+                    workbook_availability, report = cached
+                    self.availability_report.extend({**r, '檔案': teacher_file.name} for r in report)
+                availability.update(workbook_availability)
+                if self.verbose:
+                    self.reporter.write(f"✓ 由活頁簿 **{teacher_file.name}** 載入 {len(workbook_availability)} 位教師的可用時間"
+                             f"{'（快取）' if cached else ''}")
+                continue
+            
+            teacher_name = teacher_file.name.replace('.csv', '')
+            
+            try:
+                if cached is None:
+                    teacher_slots = self.parse_teacher_csv(BytesIO(raw))
+                    # 快取內容與檔名無關，教師姓名於讀取時再由檔名決定
+                    self.save_cached_file(key, {'': teacher_slots}, [])
+                else:
+                    teacher_slots = cached[0]['']
+                
+                availability[teacher_name] = teacher_slots
+                if self.verbose:
+                    self.reporter.write(f"✓ 載入教師 **{teacher_name}** 的可用時間{'（快取）' if cached else ''}")
+                
+                # 顯示不可用時段
+                unavailable = []
+                for day in WEEKDAYS:
+                    if day in teacher_slots:
+                        for period, available in teacher_slots[day].items():
+                            if not available:
+                                unavailable.append(f"星期{day}節次{period}")
+                if unavailable and self.verbose:
+                    self.reporter.write(f"  ➤ 不可用時段: {', '.join(unavailable[:10])}{'...' if len(unavailable) > 10 else ''}")
+                
+            except Exception as e:
+                self.availability_errors.append(f"{teacher_file.name}: {e}")
+                self.reporter.warning(f"無法讀取 {teacher_file.name}: {e}")
+        
+        return availability
+    
+    def parse_teacher_csv(self, source):
+        """解析單一教師的可用時間CSV，回傳 {星期: {節次: 可用(True/False)}}"""
+        df = pd.read_csv(source)
+        
+        # 建立可用時間表 [星期][節次] = 可用(True/False)
+        teacher_slots = {}
+        for day in WEEKDAYS:
+            if day in df.columns:
+                teacher_slots[day] = {}
+                for period, value in zip(df['節次'], df[day]):
+                    # 標準化節次
+                    if pd.isna(period):
+                        continue
+                    
+                    period_key = self.normalize_period(period)
+                    teacher_slots[day][period_key] = self.parse_available(value)
+        
+        return teacher_slots
+    
+    def load_cached_file(self, key):
+        """讀取單一檔案的可用時間快取，未啟用或讀取失敗時回傳 None"""
+        if not self.availability_cache_dir:
+            return None
+        cached = load_cached_availability(self.availability_cache_dir, key)
+        if cached is not None:
+            self.availability_cache_hits += 1
+        return cached
+    
+    def save_cached_file(self, key, availability, report):
+        """寫入單一檔案的可用時間快取；無法寫入時僅略過，不影響排課"""
+        if not self.availability_cache_dir:
+            return
+        try:
+            save_cached_availability(self.availability_cache_dir, key, availability, report)
+            prune_availability_cache(self.availability_cache_dir)
+        except OSError:
+            pass
+    
+    @staticmethod
+    def normalize_period(period):
+        """將節次轉換為標準格式（數字節次為 int，其餘為去空白字串）"""
+        if isinstance(period, str):
+            period = period.strip()
+            return int(period) if period.isdigit() else period
+        if isinstance(period, (int, float)):
+            return int(period)
+        return period
+    
+    @staticmethod
+    def parse_available(value):
+        """0或'0'表示不可排課，空白或其他值表示可排課"""
+        if value is None or pd.isna(value):
+            return True
+        if isinstance(value, str):
+            return value.strip() != '0'
+        return value != 0
+    
+    def load_availability_workbook(self, workbook_file, source=None):
+        """以唯讀串流模式讀取教師可用時間活頁簿
+        
+        支援兩種格式：
+            1. 每位教師一個工作表（工作表名稱為教師姓名，欄位同教師CSV）
+            2. 單一長表格式，欄位為 教師、星期、節次、可用
+        每個工作表的檢查結果記錄於 self.availability_report；source 為已讀出的檔案內容
+        """
+        availability = {}
+        weekdays = ['一', '二', '三', '四', '五']
+        
+        try:
+            from openpyxl import load_workbook  # 只有上傳活頁簿時才需要
+            workbook = load_workbook(source or workbook_file, read_only=True, data_only=True)
+        except Exception as e:
+            self.availability_errors.append(f"{workbook_file.name}: {e}")
+            self.reporter.warning(f"無法讀取 {workbook_file.name}: {e}")
+            return availability
+        
+        try:
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                columns = [str(h).strip() if h is not None else '' for h in (header or [])]
+                report = {'檔案': workbook_file.name, '工作表': sheet.title, '格式': '',
+                          '教師數': 0, '不可用時段數': 0, '略過列數': 0, '狀態': '✓', '說明': ''}
+                
+                if {'教師', '星期', '節次'} <= set(columns):
+                    # 長表格式：一列一個 (教師, 星期, 節次, 可用)
+                    report['格式'] = '長表'
+                    teacher_idx = columns.index('教師')
+                    day_idx = columns.index('星期')
+                    period_idx = columns.index('節次')
+                    value_idx = columns.index('可用') if '可用' in columns else None
+                    sheet_teachers = set()
+                    
+                    for row in rows:
+                        teacher = row[teacher_idx] if teacher_idx < len(row) else None
+                        day = row[day_idx] if day_idx < len(row) else None
+                        period = row[period_idx] if period_idx < len(row) else None
+                        if teacher is None and day is None and period is None:
+                            continue
+                        
+                        teacher = str(teacher).strip() if teacher is not None else ''
+                        day = str(day).strip() if day is not None else ''
+                        if not teacher or day not in weekdays or period is None:
+                            report['略過列數'] += 1
+                            continue
+                        
+                        value = row[value_idx] if value_idx is not None and value_idx < len(row) else None
+                        is_available = self.parse_available(value)
+                        teacher_slots = availability.setdefault(teacher, {})
+                        teacher_slots.setdefault(day, {})[self.normalize_period(period)] = is_available
+                        sheet_teachers.add(teacher)
+                        if not is_available:
+                            report['不可用時段數'] += 1
+                    
+                    report['教師數'] = len(sheet_teachers)
+                
+                elif '節次' in columns:
+                    # 每位教師一個工作表
+                    report['格式'] = '教師工作表'
+                    teacher_name = sheet.title.strip()
+                    period_idx = columns.index('節次')
+                    day_indices = {day: columns.index(day) for day in weekdays if day in columns}
+                    teacher_slots = {day: {} for day in day_indices}
+                    
+                    for row in rows:
+                        period = row[period_idx] if period_idx < len(row) else None
+                        if period is None or (isinstance(period, str) and not period.strip()):
+                            if any(v is not None for v in row):
+                                report['略過列數'] += 1
+                            continue
+                        
+                        period_key = self.normalize_period(period)
+                        for day, day_idx in day_indices.items():
+                            value = row[day_idx] if day_idx < len(row) else None
+                            is_available = self.parse_available(value)
+                            teacher_slots[day][period_key] = is_available
+                            if not is_available:
+                                report['不可用時段數'] += 1
+                    
+                    if not day_indices:
+                        report['狀態'] = '⚠️'
+                        report['說明'] = '缺少星期欄位（一～五）'
+                    else:
+                        missing_days = [day for day in weekdays if day not in day_indices]
+                        if missing_days:
+                            report['說明'] = f"缺少星期欄位: {','.join(missing_days)}"
+                        availability[teacher_name] = teacher_slots
+                        report['教師數'] = 1
+                
+                else:
+                    report['狀態'] = '✗'
+                    report['說明'] = '無法辨識格式，需有「節次」欄位或「教師、星期、節次」欄位'
+                
+                if report['略過列數'] and report['狀態'] == '✓':
+                    report['狀態'] = '⚠️'
+                    report['說明'] = (report['說明'] + ' ' if report['說明'] else '') + '部分列資料不完整已略過'
+                
+                self.availability_report.append(report)
+        finally:
+            workbook.close()
+        
+        return availability
+    
+    def parse_periods(self, periods_str):
+        """解析節數字串為列表，處理分號分隔"""
+        if pd.isna(periods_str):
+            return []
+        periods_str = str(periods_str).strip()
+        
+        # 處理分號分隔
+        if ';' in periods_str:
+            parts = periods_str.split(';')
+        else:
+            parts = periods_str.split(',')
+        
+        result = []
+        for p in parts:
+            p = p.strip()
+            if p.isdigit():
+                result.append(int(p))
+            elif p == 'E':
+                result.append('E')
+            elif p:
+                result.append(p)
+        
+        return result
+    
+    @staticmethod
+    def clean_text_column(column, na_value):
+        """將文字欄位去除前後空白，缺值以 na_value 取代"""
+        column = column.astype(object)
+        missing = column.isna()
+        cleaned = column.where(~missing, '').astype(str).str.strip()
+        return cleaned.astype(object).where(~missing, na_value)
+    
+    @staticmethod
+    def numeric_column(column):
+        """將數值欄位轉為整數型別，無法完整轉換時保留原值"""
+        numeric = pd.to_numeric(column, errors='coerce')
+        if numeric.notna().all() and (numeric % 1 == 0).all():
+            return numeric.astype('int64')
+        return column.astype(object)
+    
+    def parse_periods_column(self, column):
+        """以向量化字串操作解析整欄節數，回傳每列的節次列表"""
+        if pd.api.types.is_numeric_dtype(column):
+            column = column.astype('Int64')
+        text = self.clean_text_column(column, '').astype(str)
+        
+        # 有分號時以分號分隔，否則以逗號分隔
+        text = text.where(text.str.contains(';', regex=False), text.str.replace(',', ';', regex=False))
+        parts = text.str.split(';').explode().str.strip()
+        parts = parts[parts.notna() & (parts != '')]
+        
+        is_digit = parts.str.isdigit()
+        values = parts.astype(object)
+        values[is_digit] = parts[is_digit].astype('int64').astype(object)
+        
+        # explode 後同一列的節次相鄰，依列邊界一次切開
+        rows = values.index.to_numpy()
+        boundaries = np.flatnonzero(rows[1:] != rows[:-1]) + 1
+        chunks = np.split(values.to_numpy(), boundaries) if len(rows) else []
+        periods = dict(zip(rows[np.r_[0, boundaries]] if len(rows) else [], chunks))
+        return [periods[i].tolist() if i in periods else [] for i in column.index]
+    
+    def process_courses(self):
+        """處理課程資料，分離已排課和待排課（整欄向量化處理）"""
+        df = self.courses_df.reset_index()
+        original_index = df.pop(df.columns[0])
+        
+        # 欄位標準化
+        table = pd.DataFrame({
+            'index': original_index,
+            '系所': df['系所'],
+            '班級': self.clean_text_column(df['班級'], 'nan'),
+            '科目代碼': df['科目代碼'],
+            '科目名稱': df['科目名稱'],
+            '組別': self.clean_text_column(df['組別'], ''),
+            '修選別': self.numeric_column(df['修選別']),
+            '時數': self.numeric_column(df['時數']),
+            '授課教師': self.clean_text_column(df['授課教師'], 'nan'),
+            '星期': self.clean_text_column(df['星期'], None),
+            '節數': df['節數'].astype(object).where(df['節數'].notna(), None),
+            '課程安排方式': self.numeric_column(df['課程安排方式']),
+            '人數': pd.to_numeric(df['人數'], errors='coerce').fillna(0).astype('int64') if '人數' in df else 0,
+            '教室需求': self.clean_text_column(df['教室需求'], '') if '教室需求' in df else ''
+        })
+        
+        # 多班級拆成列表，供衝突檢查直接使用；相同的班級字串只拆一次，各列共用同一個（唯讀）列表
+        class_codes, class_values = pd.factorize(table['班級'])
+        class_splits = [[c.strip() for c in str(value).split(';')] for value in class_values]
+        
+        # 以布林遮罩分離已排課和待排課
+        self.is_fixed = (table['星期'].notna() & ~table['星期'].isin(['', 'nan'])).to_numpy()
+        fixed_periods = self.parse_periods_column(df['節數'][self.is_fixed])
+        
+        self.course_table = table
+        self.course_class_lists = [class_splits[code] for code in class_codes]
+        
+        # 每門課程佔用的資源量（班級數×時數），供 DSatur 的競爭度排序直接查表
+        class_counts = np.array([len(classes) for classes in class_splits], dtype=np.int64)[class_codes]
+        hours = pd.to_numeric(table['時數'], errors='coerce').fillna(0).to_numpy()
+        self.course_load = dict(zip(original_index.tolist(), (class_counts * hours).tolist()))
+        
+        columns = list(table.columns)
+        records = [dict(zip(columns, row)) for row in zip(*(table[c].tolist() for c in columns))]
+        for course, classes in zip(records, self.course_class_lists):
+            course['班級_列表'] = classes
+        
+        fixed_positions = np.flatnonzero(self.is_fixed)
+        for pos, periods in zip(fixed_positions, fixed_periods):
+            records[pos]['節數_列表'] = periods
+        
+        self.scheduled_courses = [records[pos] for pos in fixed_positions]
+        self.fixed_course_indices = {records[pos]['index'] for pos in fixed_positions}
+        self.to_schedule_courses = [records[pos] for pos in np.flatnonzero(~self.is_fixed)]
+        
+        self.course_groups = defaultdict(list)
+        for course in self.to_schedule_courses:
+            self.course_groups[(course['科目代碼'], course['課程安排方式'])].append(course)
+        
+        if self.verbose:
+            self.reporter.write(f"📊 已排課程: **{len(self.scheduled_courses)}** 門")
+            self.reporter.write(f"📊 待排課程: **{len(self.to_schedule_courses)}** 門")
+    
+    def get_available_slots(self, course):
+        """獲取課程的可用時段"""
+        time_hours = course['時數']
+        is_required = course['修選別'] == 1
+        group = course['組別']
+        
+        slots = []
+        
+        # 第二專長的特殊時段
+        if group == '第二專長':
+            special_slots = [
+                ('一', [1, 2, 3, 4]),
+                ('三', [5, 6, 7, 8]),
+                ('五', [5, 6, 7, 8]),
+            ]
+            for day, periods in special_slots:
+                if time_hours == 2:
+                    slots.append((day, periods[:2]))
+                    slots.append((day, periods[2:4]))
+                elif time_hours == 3:
+                    slots.append((day, periods[:3]))
+                elif time_hours == 4:
+                    slots.append((day, periods))
+            return slots
+        
+        weekdays = ['一', '二', '三', '四', '五']
+        is_remote = (group == '遠距' or '遠距' in str(group))
+        
+        if time_hours == 2:
+            for day in weekdays:
+                if is_remote:
+                    slots.append((day, [1, 2]))
+                slots.append((day, [3, 4]))
+                slots.append((day, [5, 6]))
+                slots.append((day, [7, 8]))
+        
+        elif time_hours == 3:
+            for day in weekdays:
+                slots.append((day, [3, 4, 'E']))
+                if not is_required:
+                    slots.append((day, ['E', 5, 6]))
+                slots.append((day, [7, 8, 9]))
+        
+        elif time_hours == 4:
+            for day in weekdays:
+                if is_remote:
+                    slots.append((day, [1, 2, 3, 4]))
+                slots.append((day, [5, 6, 7, 8]))
+        
+        return slots
+    
+    def check_teacher_available(self, teacher, day, periods):
+        """檢查教師在指定時段是否可用"""
+        if teacher == '無' or teacher == 'nan' or not teacher or pd.isna(teacher):
+            return True
+            
+        if teacher not in self.teacher_availability:
+            return True
+        
+        teacher_slots = self.teacher_availability[teacher]
+        if day not in teacher_slots:
+            return True
+        
+        for period in periods:
+            if isinstance(period, int):
+                check_period = period
+            elif period == 'E':
+                check_period = 'E'
+            else:
+                check_period = period
+            
+            if check_period not in teacher_slots[day]:
+                found = False
+                for key in teacher_slots[day].keys():
+                    if str(key) == str(check_period):
+                        if not teacher_slots[day][key]:
+                            return False
+                        found = True
+                        break
+                if not found:
+                    continue
+            else:
+                if not teacher_slots[day][check_period]:
+                    return False
+        
+        return True
+    
+    def check_conflict(self, schedule, course, day, periods):
+        """檢查是否有衝突"""
+        classes = course['班級_列表']
+        teacher = course['授課教師']
+        
+        for scheduled in schedule:
+            scheduled_day = scheduled.get('安排星期')
+            scheduled_periods = scheduled.get('安排節數', scheduled.get('節數_列表', []))
+            
+            if not scheduled_day or not scheduled_periods:
+                continue
+            
+            if scheduled_day != day:
+                continue
+            
+            overlap = set(periods) & set(scheduled_periods)
+            if not overlap:
+                continue
+            
+            scheduled_classes = scheduled['班級_列表']
+            if set(classes) & set(scheduled_classes):
+                return True
+            
+            if teacher not in ['無', 'nan', ''] and scheduled['授課教師'] not in ['無', 'nan', '']:
+                if scheduled['授課教師'] == teacher:
+                    return True
+        
+        return False
+    
+    def create_individual(self):
+        """創建一個染色體（排課方案）"""
+        schedule = []
+        
+        for course in self.scheduled_courses:
+            schedule.append({
+                **course,
+                '安排星期': course['星期'],
+                '安排節數': course['節數_列表'],
+                '選擇的課程安排方式': course['課程安排方式']
+            })
+        
+        processed_codes = set()
+        
+        for course in self.to_schedule_courses:
+            code = course['科目代碼']
+            
+            if code in processed_codes:
+                continue
+            
+            method1_courses = [c for c in self.to_schedule_courses 
+                              if c['科目代碼'] == code and c['課程安排方式'] == 1]
+            method2_courses = [c for c in self.to_schedule_courses 
+                              if c['科目代碼'] == code and c['課程安排方式'] == 2]
+            
+            if not method1_courses and not method2_courses:
+                method0_courses = [c for c in self.to_schedule_courses 
+                                  if c['科目代碼'] == code]
+                for c in method0_courses:
+                    slots = self.get_available_slots(c)
+                    random.shuffle(slots)
+                    
+                    assigned = False
+                    for day, periods in slots:
+                        if self.check_teacher_available(c['授課教師'], day, periods):
+                            if not self.check_conflict(schedule, c, day, periods):
+                                schedule.append({
+                                    **c,
+                                    '安排星期': day,
+                                    '安排節數': periods,
+                                    '選擇的課程安排方式': 0
+                                })
+                                assigned = True
+                                break
+                    
+                    if not assigned:
+                        schedule.append({
+                            **c,
+                            '安排星期': None,
+                            '安排節數': [],
+                            '選擇的課程安排方式': 0
+                        })
+                
+                processed_codes.add(code)
+                continue
+            
+            success = True
+            temp_schedule = []
+            
+            if method1_courses:
+                for c in method1_courses:
+                    slots = self.get_available_slots(c)
+                    random.shuffle(slots)
+                    
+                    assigned = False
+                    for day, periods in slots:
+                        if self.check_teacher_available(c['授課教師'], day, periods):
+                            if not self.check_conflict(schedule + temp_schedule, c, day, periods):
+                                temp_schedule.append({
+                                    **c,
+                                    '安排星期': day,
+                                    '安排節數': periods,
+                                    '選擇的課程安排方式': 1
+                                })
+                                assigned = True
+                                break
+                    
+                    if not assigned:
+                        success = False
+                        break
+                
+                if success:
+                    schedule.extend(temp_schedule)
+                    processed_codes.add(code)
+                    continue
+            
+            if method2_courses:
+                temp_schedule = []
+                success = True
+                
+                for c in method2_courses:
+                    slots = self.get_available_slots(c)
+                    random.shuffle(slots)
+                    
+                    assigned = False
+                    for day, periods in slots:
+                        if self.check_teacher_available(c['授課教師'], day, periods):
+                            if not self.check_conflict(schedule + temp_schedule, c, day, periods):
+                                temp_schedule.append({
+                                    **c,
+                                    '安排星期': day,
+                                    '安排節數': periods,
+                                    '選擇的課程安排方式': 2
+                                })
+                                assigned = True
+                                break
+                    
+                    if not assigned:
+                        success = False
+                        break
+                
+                if success:
+                    schedule.extend(temp_schedule)
+            
+            processed_codes.add(code)
+        
+        return schedule
+    
+    def build_occupancy_index(self):
+        """建立班級、教師在佔用張量中的編號"""
+        all_courses = self.scheduled_courses + self.to_schedule_courses
+        
+        class_names = sorted({c for course in all_courses for c in course['班級_列表']})
+        teacher_names = sorted({course['授課教師'] for course in all_courses
+                                if course['授課教師'] not in ['無', 'nan', '']})
+        self.class_ids = {name: i for i, name in enumerate(class_names)}
+        self.teacher_ids = {name: i for i, name in enumerate(teacher_names)}
+        self.period_columns = {p: i for i, p in enumerate(PERIOD_ORDER)}
+        self.period_columns.update({str(p): i for i, p in enumerate(PERIOD_ORDER)})
+        self.gene_cells_cache = {}
+    
+    def gene_cells(self, gene):
+        """課程安排在佔用張量中的扁平索引（班級格、教師格），依時段快取"""
+        key = (gene['index'], gene['安排星期'], tuple(gene.get('安排節數', [])))
+        cells = self.gene_cells_cache.get(key)
+        if cells is not None:
+            return cells
+        
+        n_days, n_periods = len(WEEKDAYS), len(PERIOD_ORDER)
+        day = self.weekday_map.get(gene['安排星期'])
+        columns = [self.period_columns[p] for p in gene.get('安排節數', []) if p in self.period_columns]
+        if day is None or not columns:
+            cells = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+        else:
+            offsets = np.array([day * n_periods + col for col in columns], dtype=np.intp)
+            class_rows = [self.class_ids[c] for c in gene['班級_列表'] if c in self.class_ids]
+            class_cells = (np.array(class_rows, dtype=np.intp)[:, None] * n_days * n_periods + offsets).ravel()
+            teacher_id = self.teacher_ids.get(gene['授課教師'])
+            teacher_cells = offsets + teacher_id * n_days * n_periods if teacher_id is not None else offsets[:0]
+            cells = (class_cells, teacher_cells)
+        
+        self.gene_cells_cache[key] = cells
+        return cells
+    
+    def occupancy(self, schedule):
+        """計算 班級 × 星期 × 節次 與 教師 × 星期 × 節次 的佔用張量"""
+        n_days, n_periods = len(WEEKDAYS), len(PERIOD_ORDER)
+        class_cells, teacher_cells = [], []
+        for gene in schedule:
+            if gene.get('安排星期') is None:
+                continue
+            c_cells, t_cells = self.gene_cells(gene)
+            class_cells.append(c_cells)
+            teacher_cells.append(t_cells)
+        
+        class_size = len(self.class_ids) * n_days * n_periods
+        teacher_size = len(self.teacher_ids) * n_days * n_periods
+        class_occ = np.bincount(np.concatenate(class_cells), minlength=class_size) if class_cells \
+            else np.zeros(class_size, dtype=np.intp)
+        teacher_occ = np.bincount(np.concatenate(teacher_cells), minlength=teacher_size) if teacher_cells \
+            else np.zeros(teacher_size, dtype=np.intp)
+        
+        return (class_occ.reshape(len(self.class_ids), n_days, n_periods),
+                teacher_occ.reshape(len(self.teacher_ids), n_days, n_periods))
+    
+    def compile_soft_constraints(self, soft_constraints=None):
+        """依權重設定編譯軟性限制，權重為0者不計算
+        
+        soft_constraints 為 {名稱: 權重} 或 {名稱: {'weight': 權重, 'params': {...}}}，
+        未指定者使用 SOFT_CONSTRAINTS 的預設值
+        """
+        compiled = []
+        overrides = soft_constraints or {}
+        
+        for name, rule in SOFT_CONSTRAINTS.items():
+            override = overrides.get(name, {})
+            if not isinstance(override, dict):
+                override = {'weight': override}
+            weight = override.get('weight', rule['weight'])
+            params = {**rule['params'], **override.get('params', {})}
+            if weight:
+                compiled.append((name, weight, partial(rule['kernel'], **params)))
+        
+        return compiled
+    
+    def soft_penalty(self, schedule):
+        """一次建立佔用張量，計算所有軟性限制的加權懲罰"""
+        if not self.soft_constraints:
+            return 0
+        class_occ, teacher_occ = self.occupancy(schedule)
+        total = sum(weight * kernel(class_occ, teacher_occ) for _, weight, kernel in self.soft_constraints)
+        return total.item() if hasattr(total, 'item') else total
+    
+    def soft_constraint_report(self, schedule):
+        """列出各軟性限制的違反量與懲罰"""
+        class_occ, teacher_occ = self.occupancy(schedule)
+        report = []
+        for name, weight, kernel in self.soft_constraints:
+            violations = kernel(class_occ, teacher_occ)
+            report.append({
+                '限制': SOFT_CONSTRAINTS[name]['label'],
+                '權重': weight,
+                '違反量': int(violations),
+                '懲罰': weight * int(violations)
+            })
+        return report
+    
+    def teacher_feasible_slots(self, course):
+        """課程符合教師可用時間的候選時段（與其他課程無關，依課程快取）"""
+        slots = self.teacher_slots_cache.get(course['index'])
+        if slots is None:
+            slots = [(day, periods) for day, periods in self.get_available_slots(course)
+                     if self.check_teacher_available(course['授課教師'], day, periods)]
+            self.teacher_slots_cache[course['index']] = slots
+        return slots
+    
+    def placement_units(self):
+        """將待排課程整理為排課單位，規則同 create_individual
+        
+        課程安排方式皆為0的科目，每門課程各自為一個單位；
+        其餘科目整組為一個單位，先嘗試方式1，失敗再嘗試方式2。結果快取於 placement_units_cache。
+        """
+        if self.placement_units_cache is not None:
+            return self.placement_units_cache
+        
+        units = []
+        processed_codes = set()
+        for course in self.to_schedule_courses:
+            code = course['科目代碼']
+            if code in processed_codes:
+                continue
+            processed_codes.add(code)
+            
+            same_code = [c for c in self.to_schedule_courses if c['科目代碼'] == code]
+            method1 = [c for c in same_code if c['課程安排方式'] == 1]
+            method2 = [c for c in same_code if c['課程安排方式'] == 2]
+            
+            if not method1 and not method2:
+                units.extend([[(0, [c])] for c in same_code])
+            else:
+                units.append([(method, courses) for method, courses in ((1, method1), (2, method2)) if courses])
+        self.placement_units_cache = units
+        return units
+    
+    def create_individual_dsatur(self):
+        """以最受限優先（DSatur）方式創建染色體
+        
+        每次挑選剩餘可行時段最少的排課單位先排，同分時以佔用資源（班級數×時數）
+        較多者優先，再以隨機值決定以維持族群多樣性；每排入一門課程只更新共用
+        班級或教師的單位。
+        """
+        schedule = [{
+            **course,
+            '安排星期': course['星期'],
+            '安排節數': course['節數_列表'],
+            '選擇的課程安排方式': course['課程安排方式']
+        } for course in self.scheduled_courses]
+        
+        busy = set()
+        
+        cells = self.resource_cells
+        
+        for gene in schedule:
+            if gene['安排星期']:
+                busy.update(cells(gene, gene['安排星期'], gene['安排節數']))
+        
+        def free_slots(course):
+            return [(day, periods) for day, periods in self.teacher_feasible_slots(course)
+                    if busy.isdisjoint(cells(course, day, periods))]
+        
+        units = self.placement_units()
+        unit_resources = []
+        resource_units = defaultdict(set)
+        for i, unit in enumerate(units):
+            resources = set()
+            for _, courses in unit:
+                for c in courses:
+                    resources.update(('班級', name) for name in c['班級_列表'])
+                    if c['授課教師'] not in ['無', 'nan', '']:
+                        resources.add(('教師', c['授課教師']))
+            unit_resources.append(resources)
+            for r in resources:
+                resource_units[r].add(i)
+        
+        def saturation(unit):
+            return min(len(free_slots(c)) for c in unit[0][1])
+        
+        contention = [-sum(self.course_load[c['index']] for c in unit[0][1]) for unit in units]
+        tie_break = [random.random() for _ in units]
+        remaining = set(range(len(units)))
+        feasible = {i: saturation(units[i]) for i in remaining}
+        
+        while remaining:
+            i = min(remaining, key=lambda u: (feasible[u], contention[u], tie_break[u]))
+            remaining.discard(i)
+            success = False
+            
+            for method, courses in units[i]:
+                placed = []
+                for c in courses:
+                    slots = free_slots(c)
+                    if not slots:
+                        break
+                    day, periods = random.choice(slots)
+                    busy.update(cells(c, day, periods))
+                    placed.append({**c, '安排星期': day, '安排節數': periods, '選擇的課程安排方式': method})
+                
+                if len(placed) == len(courses):
+                    schedule.extend(placed)
+                    success = True
+                    break
+                
+                # 整組無法排入：撤銷本組已佔用的時段
+                for gene in placed:
+                    busy.difference_update(cells(gene, gene['安排星期'], gene['安排節數']))
+                
+                if method == 0:
+                    schedule.append({**courses[0], '安排星期': None, '安排節數': [], '選擇的課程安排方式': 0})
+            
+            if not success:
+                continue
+            
+            affected = set()
+            for r in unit_resources[i]:
+                affected.update(resource_units[r])
+            for u in affected & remaining:
+                feasible[u] = saturation(units[u])
+        
+        return schedule
+    
+    def count_unscheduled(self, schedule):
+        """染色體中未排入的待排課程數
+        
+        以排課單位計算：有方式1、2可選的科目只需排入其中一組，依排入最多課程的方式計算缺少的課程數
+        """
+        placed = {c['index'] for c in schedule if c.get('安排星期') is not None}
+        return sum(min(sum(c['index'] not in placed for c in courses) for _, courses in unit)
+                   for unit in self.placement_units())
+    
+    def fitness(self, schedule):
+        """計算適應度（排入課程數、硬性衝突與軟性限制）"""
+        score = 0
+        penalties = 0
+        
+        scheduled_count = len([s for s in schedule if s.get('安排星期') is not None])
+        score += scheduled_count * 100
+        
+        for i, course1 in enumerate(schedule):
+            if course1.get('安排星期') is None:
+                continue
+                
+            for course2 in schedule[i+1:]:
+                if course2.get('安排星期') is None:
+                    continue
+                
+                if course1['安排星期'] == course2['安排星期']:
+                    overlap = set(course1.get('安排節數', [])) & set(course2.get('安排節數', []))
+                    if overlap:
+                        classes1 = set(course1['班級_列表'])
+                        classes2 = set(course2['班級_列表'])
+                        if classes1 & classes2:
+                            penalties += 50
+                        
+                        teacher1 = course1['授課教師']
+                        teacher2 = course2['授課教師']
+                        if teacher1 not in ['無', 'nan', ''] and teacher2 not in ['無', 'nan', '']:
+                            if teacher1 == teacher2:
+                                penalties += 50
+        
+        penalties += self.soft_penalty(schedule)
+        
+        return score - penalties
+    
+    def genome_key(self, schedule):
+        """以各課程的安排時段計算染色體雜湊值"""
+        return hash(tuple(
+            (c['index'], c.get('安排星期'), tuple(c.get('安排節數', [])))
+            for c in schedule
+        ))
+    
+    def evaluate(self, schedule, key=None):
+        """計算適應度，相同染色體直接取用快取結果"""
+        if key is None:
+            key = self.genome_key(schedule)
+        cache = self.fitness_cache
+        
+        if key in cache:
+            cache.move_to_end(key)
+            self.fitness_cache_hits += 1
+            return cache[key]
+        
+        self.fitness_cache_misses += 1
+        score = self.fitness(schedule)
+        cache[key] = score
+        if len(cache) > self.fitness_cache_size:
+            cache.popitem(last=False)
+        return score
+    
+    def is_fixed_gene(self, gene):
+        """是否為已排定課程（不參與交叉與變異）"""
+        return gene['index'] in self.fixed_course_indices
+    
+    def crossover(self, parent1, parent2, swap_rate=0.5):
+        """交叉（每個待排課程以 swap_rate 機率取自 parent2）
+        
+        子代直接引用親代的課程基因，不複製任何基因內容；
+        基因一經建立即不再修改，因此可安全地在多個染色體間共用。
+        """
+        parent2_genes = {}
+        for c in parent2:
+            parent2_genes.setdefault((c.get('科目代碼'), c.get('組別')), c)
+        
+        child = [c for c in parent1 if self.is_fixed_gene(c)]
+        
+        to_schedule = [c for c in parent1 if not self.is_fixed_gene(c)]
+        for course in to_schedule:
+            if random.random() >= swap_rate:
+                child.append(course)
+            else:
+                child.append(parent2_genes.get((course.get('科目代碼'), course.get('組別')), course))
+        
+        return child
+    
+    def mutate(self, schedule):
+        """變異
+        
+        只為被移動的課程建立新基因，其餘基因與原染色體共用。
+        """
+        to_schedule = [i for i, c in enumerate(schedule) 
+                      if not self.is_fixed_gene(c) and c.get('安排星期') is not None]
+        
+        if not to_schedule:
+            return schedule
+        
+        idx = random.choice(to_schedule)
+        course = schedule[idx]
+        
+        slots = self.get_available_slots(course)
+        random.shuffle(slots)
+        
+        temp_schedule = schedule[:idx] + schedule[idx + 1:]
+        for day, periods in slots:
+            if self.check_teacher_available(course['授課教師'], day, periods):
+                if not self.check_conflict(temp_schedule, course, day, periods):
+                    mutated = list(schedule)
+                    mutated[idx] = {**course, '安排星期': day, '安排節數': periods}
+                    return mutated
+        
+        return schedule
+    
+    def tournament_select(self, fitness_scores, tournament_size):
+        """錦標賽選擇（fitness_scores 已依適應度由高到低排序）"""
+        size = min(tournament_size, len(fitness_scores))
+        return fitness_scores[min(random.sample(range(len(fitness_scores)), size))][1]
+    
+    def run_ga(self, population_size=100, generations=200, progress_bar=None,
+               adaptive=False, tournament_size=3, stagnation_limit=30, restart_ratio=0.5,
+               initializer='random'):
+        """執行遺傳演算法
+        
+        adaptive=True 時使用錦標賽選擇，並依族群多樣性與改善情況逐代調整
+        突變率與交叉率；連續 stagnation_limit 代未改善時，以 create_individual
+        重新產生適應度最差的 restart_ratio 比例個體。
+        adaptive=False（預設）時使用原本的固定參數（前半隨機選擇、交叉率0.5、突變率0.2）。
+        initializer 為 'random'（create_individual，依課程檔順序）或
+        'dsatur'（create_individual_dsatur，最受限優先）。
+        """
+        create = self.create_individual_dsatur if initializer == 'dsatur' else self.create_individual
+        population = [create() for _ in range(population_size)]
+        self.initial_unscheduled = sum(self.count_unscheduled(ind) for ind in population) / population_size
+        
+        best_solution = None
+        best_fitness = float('-inf')
+        mutation_rate, swap_rate = 0.2, 0.5
+        stagnation = 0
+        self.ga_history = []
+        
+        for gen in range(generations):
+            keyed = [(self.genome_key(ind), ind) for ind in population]
+            fitness_scores = [(self.evaluate(ind, key), ind) for key, ind in keyed]
+            fitness_scores.sort(reverse=True, key=lambda x: x[0])
+            
+            if fitness_scores[0][0] > best_fitness:
+                best_fitness = fitness_scores[0][0]
+                best_solution = fitness_scores[0][1]
+                stagnation = 0
+            else:
+                stagnation += 1
+            
+            diversity = len({key for key, _ in keyed}) / len(keyed)
+            
+            if adaptive:
+                # 多樣性低或停滯時提高突變與交叉，持續改善時回到基準值
+                pressure = (1 - diversity) + stagnation / stagnation_limit
+                mutation_rate = min(0.8, max(0.05, 0.2 * (1 + 2 * pressure)))
+                swap_rate = min(0.5, max(0.2, 0.3 + 0.2 * pressure))
+            
+            self.ga_history.append({
+                '世代': gen + 1, '最佳適應度': best_fitness, '多樣性': diversity,
+                '突變率': mutation_rate, '交叉率': swap_rate
+            })
+            
+            if progress_bar:
+                progress_bar.progress((gen + 1) / generations)
+            
+            elite_size = population_size // 10
+            new_population = [ind for _, ind in fitness_scores[:elite_size]]
+            
+            if adaptive and stagnation >= stagnation_limit:
+                # 停滯重啟：保留較佳個體，其餘重新產生
+                restart_count = int(population_size * restart_ratio)
+                survivors = population_size - restart_count
+                new_population = [ind for _, ind in fitness_scores[:max(survivors, elite_size)]]
+                while len(new_population) < population_size:
+                    new_population.append(create())
+                stagnation = 0
+                population = new_population
+                continue
+            
+            while len(new_population) < population_size:
+                if adaptive:
+                    parent1 = self.tournament_select(fitness_scores, tournament_size)
+                    parent2 = self.tournament_select(fitness_scores, tournament_size)
+                else:
+                    parent1 = random.choice(fitness_scores[:population_size//2])[1]
+                    parent2 = random.choice(fitness_scores[:population_size//2])[1]
+                
+                child = self.crossover(parent1, parent2, swap_rate)
+                
+                if random.random() < mutation_rate:
+                    child = self.mutate(child)
+                
+                new_population.append(child)
+            
+            population = new_population
+        
+        return best_solution, best_fitness
+    
+    def find_components(self):
+        """找出課程–班級–教師交互圖的連通元件，回傳各元件的課程位置（course_table 列號）
+        
+        共用班級、教師的課程相連；同科目代碼且需整組排課（方式1、2）的課程也相連。
+        """
+        parent = list(range(len(self.course_table)))
+        
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        
+        first_owner = {}
+        records = self.course_table[['授課教師', '科目代碼', '課程安排方式']].itertuples(index=False)
+        for pos, (classes, (teacher, code, method)) in enumerate(zip(self.course_class_lists, records)):
+            resources = [('班級', c) for c in classes]
+            if teacher not in ['無', 'nan', '']:
+                resources.append(('教師', teacher))
+            if not self.is_fixed[pos] and method in (1, 2):
+                resources.append(('科目', code))
+            
+            for r in resources:
+                owner = first_owner.setdefault(r, pos)
+                root_a, root_b = find(owner), find(pos)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+        
+        components = defaultdict(list)
+        for pos in range(len(parent)):
+            components[find(pos)].append(pos)
+        return sorted(components.values(), key=len, reverse=True)
+    
+    def subproblem_args(self, positions):
+        """建立子問題所需的資料（可跨行程傳遞）"""
+        courses_df = self.courses_df.iloc[positions]
+        teachers = set(self.course_table['授課教師'].iloc[positions])
+        availability = {t: slots for t, slots in self.teacher_availability.items() if t in teachers}
+        scheduler_kwargs = {
+            'fitness_cache_size': self.fitness_cache_size,
+            'soft_constraints': self.soft_constraint_overrides,
+        }
+        return courses_df, availability, scheduler_kwargs
+    
+    def solve(self, population_size=100, generations=200, progress_bar=None,
+              decompose=True, max_workers=None, **ga_kwargs):
+        """排課主流程：將互不相關的班級與教師分解為獨立子問題，平行求解後合併
+        
+        只有一個元件或 decompose=False 時直接執行 run_ga；max_workers=1 時依序求解各子問題。
+        """
+        components = self.find_components() if decompose else []
+        components = [c for c in components if not self.is_fixed[c].all()]
+        
+        if len(components) <= 1:
+            return self.run_ga(population_size, generations, progress_bar, **ga_kwargs)
+        
+        if self.verbose:
+            self.reporter.write(f"🧩 分解為 **{len(components)}** 個獨立子問題，"
+                     f"最大子問題 {len(components[0])} 門課程")
+        
+        ga_kwargs = {'population_size': population_size, 'generations': generations, **ga_kwargs}
+        jobs = [(*self.subproblem_args(positions), ga_kwargs) for positions in components]
+        results = [None] * len(jobs)
+        
+        def report(done):
+            if progress_bar:
+                progress_bar.progress(done / len(jobs))
+        
+        def solve_serially():
+            for i, job in enumerate(jobs):
+                if results[i] is None:
+                    results[i] = solve_component(*job)
+                report(sum(r is not None for r in results))
+        
+        if max_workers == 1:
+            # 已在工作行程中執行（如排課服務）時不再另開行程池
+            solve_serially()
+        else:
+            try:
+                # 以 spawn 啟動子行程，避免在多執行緒的 Streamlit 伺服器中 fork
+                with ProcessPoolExecutor(max_workers=max_workers,
+                                         mp_context=multiprocessing.get_context('spawn')) as executor:
+                    futures = {executor.submit(solve_component, *job): i for i, job in enumerate(jobs)}
+                    for done, future in enumerate(as_completed(futures), 1):
+                        results[futures[future]] = future.result()
+                        report(done)
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+                # 無法使用多行程時（行程池無法啟動或資料無法傳送）改為依序求解尚未完成的子問題；
+                # 子問題本身的錯誤直接拋出
+                if self.verbose:
+                    self.reporter.warning(f"無法平行求解子問題，改為依序執行: {e}")
+                solve_serially()
+        
+        # 合併各子問題結果；未含待排課程的元件直接保留已排課程
+        covered = {pos for positions in components for pos in positions}
+        merged = [{
+            **course,
+            '安排星期': course['星期'],
+            '安排節數': course['節數_列表'],
+            '選擇的課程安排方式': course['課程安排方式']
+        } for pos, course in zip(np.flatnonzero(self.is_fixed), self.scheduled_courses)
+            if pos not in covered]
+        for best, _, _ in results:
+            merged.extend(best)
+        
+        self.fitness_cache_hits = sum(stats['hits'] for _, _, stats in results)
+        self.fitness_cache_misses = sum(stats['misses'] for _, _, stats in results)
+        self.initial_unscheduled = sum(stats['initial_unscheduled'] for _, _, stats in results)
+        
+        histories = [pd.DataFrame(stats['history']).set_index('世代') for _, _, stats in results]
+        combined = pd.concat(histories, keys=range(len(histories)))
+        self.ga_history = pd.DataFrame({
+            '最佳適應度': combined['最佳適應度'].groupby(level=1).sum(),
+            '多樣性': combined['多樣性'].groupby(level=1).mean(),
+            '突變率': combined['突變率'].groupby(level=1).mean(),
+            '交叉率': combined['交叉率'].groupby(level=1).mean(),
+        }).reset_index().to_dict('records')
+        
+        return merged, self.fitness(merged)
+    
+    def generate_results(self, schedule):
+        """生成排課結果"""
+        # 收集所有班級
+        all_classes = set()
+        for course in schedule:
+            all_classes.update(course['班級_列表'])
+        
+        # 為每個班級產生課表
+        results = {}
+        for class_name in sorted(all_classes):
+            df = self.class_table(schedule, class_name)
+            if df is not None:
+                results[class_name] = df
+        
+        # 未排課程
+        unscheduled = self.unscheduled_courses(schedule)
+        
+        # 衝突檢查
+        conflicts = self.check_conflicts(schedule)
+        
+        return results, unscheduled, conflicts
+    
+    def class_table(self, schedule, class_name):
+        """產生單一班級的課表資料，該班級沒有已排課程時回傳 None"""
+        class_schedule = []
+        
+        for course in schedule:
+            if class_name in course['班級_列表']:
+                if course.get('安排星期') is not None:
+                    periods_str = ';'.join(map(str, course['安排節數']))
+                    
+                    class_schedule.append({
+                        '科目代碼': course['科目代碼'],
+                        '科目名稱': course['科目名稱'],
+                        '組別': course['組別'],
+                        '修選別': '必修' if course['修選別'] == 1 else '選修',
+                        '時數': course['時數'],
+                        '授課教師': course['授課教師'],
+                        '安排星期': course['安排星期'],
+                        '安排節數': periods_str,
+                        '選擇的課程安排方式': course.get('選擇的課程安排方式', 0)
+                    })
+                    if '教室' in course:
+                        class_schedule[-1]['教室'] = course['教室']
+        
+        if not class_schedule:
+            return None
+        
+        df = pd.DataFrame(class_schedule)
+        weekday_order = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5}
+        df['排序_星期'] = df['安排星期'].map(weekday_order)
+        
+        def parse_first_period(x):
+            first = x.split(';')[0] if ';' in x else x
+            if first == 'E':
+                return 4.5
+            try:
+                return int(first)
+            except:
+                return 0
+        
+        df['排序_節數'] = df['安排節數'].apply(parse_first_period)
+        df = df.sort_values(['排序_星期', '排序_節數'])
+        df = df.drop(['排序_星期', '排序_節數'], axis=1)
+        
+        return df
+    
+    def unscheduled_courses(self, schedule, cell_index=None):
+        """列出未排入的待排課程，並附上各候選時段無法排入的原因
+        
+        以排課單位判斷（同 count_unscheduled）：方式1、2任一組已全部排入的科目不列出；
+        兩組皆未排完時，列出各組尚未排入的課程。
+        """
+        placed = {c['index'] for c in schedule if c.get('安排星期') is not None}
+        
+        unscheduled = []
+        for unit in self.placement_units():
+            missing = [[c for c in courses if c['index'] not in placed] for _, courses in unit]
+            if not all(missing):
+                continue
+            for course in (c for courses in missing for c in courses):
+                if cell_index is None:
+                    cell_index = self.build_cell_index(schedule)
+                unscheduled.append({
+                    '科目代碼': course['科目代碼'],
+                    '科目名稱': course['科目名稱'],
+                    '班級': course['班級'],
+                    '組別': course['組別'],
+                    '授課教師': course['授課教師'],
+                    '時數': course['時數'],
+                    '課程安排方式': course['課程安排方式'],
+                    **self.diagnose_course(schedule, course, cell_index)
+                })
+        return unscheduled
+    
+    def build_cell_index(self, schedule):
+        """時段格 → 佔用該格的課程位置"""
+        cell_index = defaultdict(set)
+        for pos, gene in enumerate(schedule):
+            if gene.get('安排星期') is not None:
+                for cell in self.resource_cells(gene, gene['安排星期'], gene['安排節數']):
+                    cell_index[cell].add(pos)
+        return cell_index
+    
+    def diagnose_course(self, schedule, course, cell_index, max_blockers=5):
+        """分析未排課程的候選時段：各時段依序歸類為教師不可用、班級衝堂、教師衝堂或尚可排入
+        
+        同科目代碼的課程（同組或另一種安排方式）會隨本課程一起調整，不視為阻擋。
+        """
+        code = course['科目代碼']
+        candidates = self.get_available_slots(course)
+        teacher_ok = {(day, tuple(periods)) for day, periods in self.teacher_feasible_slots(course)}
+        counts = {'教師不可用': 0, '班級衝堂': 0, '教師衝堂': 0, '尚可排入': 0}
+        blockers = set()
+        
+        for day, periods in candidates:
+            if (day, tuple(periods)) not in teacher_ok:
+                counts['教師不可用'] += 1
+                continue
+            
+            class_blockers, teacher_blockers = set(), set()
+            for cell in self.resource_cells(course, day, periods):
+                others = cell_index.get(cell)
+                if others:
+                    (class_blockers if cell[0] == '班級' else teacher_blockers).update(
+                        b for b in others if schedule[b]['科目代碼'] != code)
+            
+            if class_blockers:
+                counts['班級衝堂'] += 1
+            elif teacher_blockers:
+                counts['教師衝堂'] += 1
+            else:
+                counts['尚可排入'] += 1
+            blockers |= class_blockers | teacher_blockers
+        
+        names = sorted({f"{schedule[b]['科目名稱']}({schedule[b]['班級']})" for b in blockers})
+        return {
+            '候選時段數': len(candidates),
+            **counts,
+            '阻擋課程': '、'.join(names[:max_blockers]) + ('…' if len(names) > max_blockers else '')
+        }
+    
+    def check_conflicts(self, schedule):
+        """檢查衝突"""
+        conflict_map = self.conflict_map(schedule)
+        return [c for key in sorted(conflict_map) for c in conflict_map[key]]
+    
+    def conflict_map(self, schedule):
+        """以課程位置為鍵的衝突表：(i, i) 為時數不符，(i, j) 為兩門課程間的衝突"""
+        conflict_map = {}
+        
+        for i, course1 in enumerate(schedule):
+            if course1.get('安排星期') is None:
+                continue
+            
+            hours = self.hours_conflict(course1)
+            if hours:
+                conflict_map[(i, i)] = [hours]
+            
+            for j in range(i + 1, len(schedule)):
+                pair = self.pair_conflicts(course1, schedule[j])
+                if pair:
+                    conflict_map[(i, j)] = pair
+        
+        return conflict_map
+    
+    def hours_conflict(self, course):
+        """檢查課程排入的節數是否與時數相符"""
+        expected_periods = course['時數']
+        actual_periods = len(course.get('安排節數', []))
+        if expected_periods == actual_periods:
+            return None
+        
+        periods_str = ';'.join(map(str, course.get('安排節數', [])))
+        return {
+            '衝突類型': '時數不符',
+            '課程1': f"{course['科目名稱']} ({course['班級']})",
+            '時間1': f"{course['安排星期']} 節次:{periods_str}",
+            '課程2': '',
+            '時間2': '',
+            '說明': f"時數為{expected_periods}但排了{actual_periods}節"
+        }
+    
+    def pair_conflicts(self, course1, course2):
+        """檢查兩門課程之間的班級與教師衝突"""
+        conflicts = []
+        
+        if course1.get('安排星期') is None or course2.get('安排星期') is None:
+            return conflicts
+        
+        if course1['安排星期'] != course2['安排星期']:
+            return conflicts
+        
+        overlap = set(course1.get('安排節數', [])) & set(course2.get('安排節數', []))
+        if not overlap:
+            return conflicts
+        
+        periods1_str = ';'.join(map(str, course1.get('安排節數', [])))
+        periods2_str = ';'.join(map(str, course2.get('安排節數', [])))
+        
+        classes1 = set(course1['班級_列表'])
+        classes2 = set(course2['班級_列表'])
+        common_classes = classes1 & classes2
+        if common_classes:
+            conflicts.append({
+                '衝突類型': '班級時間衝突',
+                '課程1': f"{course1['科目名稱']} ({course1['班級']})",
+                '時間1': f"{course1['安排星期']} 節次:{periods1_str}",
+                '課程2': f"{course2['科目名稱']} ({course2['班級']})",
+                '時間2': f"{course2['安排星期']} 節次:{periods2_str}",
+                '說明': f"班級 {','.join(common_classes)} 時間重疊"
+            })
+        
+        teacher1 = course1['授課教師']
+        teacher2 = course2['授課教師']
+        if teacher1 not in ['無', 'nan', ''] and teacher2 not in ['無', 'nan', '']:
+            if teacher1 == teacher2:
+                conflicts.append({
+                    '衝突類型': '教師時間衝突',
+                    '課程1': f"{course1['科目名稱']} ({course1['班級']})",
+                    '時間1': f"{course1['安排星期']} 節次:{periods1_str}",
+                    '課程2': f"{course2['科目名稱']} ({course2['班級']})",
+                    '時間2': f"{course2['安排星期']} 節次:{periods2_str}",
+                    '說明': f"教師 {teacher1} 時間重疊"
+                })
+        
+        return conflicts
+    
+    def resource_cells(self, course, day, periods):
+        """課程佔用的 (班級/教師, 名稱, 星期, 節次) 時段格"""
+        result = [('班級', c, day, p) for c in course['班級_列表'] for p in periods]
+        if course['授課教師'] not in ['無', 'nan', '']:
+            result.extend(('教師', course['授課教師'], day, p) for p in periods)
+        return result
+    
+    def assign_rooms(self, schedule, rooms):
+        """排課完成後分配教室
+        
+        依 (星期, 節次) 逐格進行二分圖匹配：已分配教室的課程在其所有節次都佔用該教室，
+        本節開始的課程只考慮在其所有節次皆空出的教室，以增廣路徑求最大匹配（容量較小的教室優先），
+        確保同一門課各節次都在同一間教室。遠距課程不分配教室。
+        回傳 (含「教室」欄位的新排課, 未分配教室的課程清單)。
+        """
+        assigned = {}
+        by_day = defaultdict(list)
+        for pos, gene in enumerate(schedule):
+            if gene.get('安排星期') is None:
+                continue
+            if '遠距' in str(gene.get('組別', '')):
+                assigned[pos] = '遠距'
+                continue
+            by_day[gene['安排星期']].append(pos)
+        
+        rooms = sorted(rooms, key=lambda r: (r['容量'], r['教室']))
+        
+        def eligible(gene):
+            need = gene.get('人數') or 0
+            features = {f.strip() for f in str(gene.get('教室需求') or '').split(';') if f.strip()}
+            return [i for i, room in enumerate(rooms)
+                    if room['容量'] >= need and features <= room['設備']]
+        
+        for day, positions in by_day.items():
+            candidates = {pos: eligible(schedule[pos]) for pos in positions}
+            booked = set()  # 已被佔用的 (教室, 節次)
+            
+            for period in PERIOD_ORDER:
+                waiting = [pos for pos in positions
+                           if period in schedule[pos]['安排節數'] and pos not in assigned]
+                if not waiting:
+                    continue
+                
+                # 只考慮在課程所有節次都未被佔用的教室
+                free = {pos: [room for room in candidates[pos]
+                              if not any((room, p) in booked for p in schedule[pos]['安排節數'])]
+                        for pos in waiting}
+                
+                # Kuhn 增廣路徑：為本節開始的課程找教室
+                match = {}
+                
+                def augment(pos, visited):
+                    for room in free[pos]:
+                        if room in visited:
+                            continue
+                        visited.add(room)
+                        if room not in match or augment(match[room], visited):
+                            match[room] = pos
+                            return True
+                    return False
+                
+                for pos in waiting:
+                    augment(pos, set())
+                
+                for room, pos in match.items():
+                    booked.update((room, p) for p in schedule[pos]['安排節數'])
+                    assigned[pos] = rooms[room]['教室']
+                
+                # 本節找不到教室的課程標記為未分配，後續節次不再嘗試以免拆到不同教室
+                for pos in waiting:
+                    assigned.setdefault(pos, '未分配')
+        
+        result = list(schedule)
+        unassigned = []
+        for pos, room in assigned.items():
+            result[pos] = {**schedule[pos], '教室': room}
+            if room == '未分配':
+                gene = schedule[pos]
+                unassigned.append({
+                    '科目代碼': gene['科目代碼'],
+                    '科目名稱': gene['科目名稱'],
+                    '班級': gene['班級'],
+                    '人數': gene.get('人數', 0),
+                    '教室需求': gene.get('教室需求', ''),
+                    '時間': f"{gene['安排星期']} 節次:{';'.join(map(str, gene['安排節數']))}"
+                })
+        
+        return result, unassigned
+
+
+def solve_component(courses_df, teacher_availability, scheduler_kwargs, ga_kwargs):
+    """在獨立行程中求解一個子問題，回傳 (最佳排課, 適應度, 統計資料)"""
+    scheduler = CourseScheduler(courses_df, [], teacher_availability=teacher_availability,
+                                verbose=False, **scheduler_kwargs)
+    best, best_fitness = scheduler.run_ga(**ga_kwargs)
+    stats = {
+        'hits': scheduler.fitness_cache_hits,
+        'misses': scheduler.fitness_cache_misses,
+        'initial_unscheduled': scheduler.initial_unscheduled,
+        'history': scheduler.ga_history,
+    }
+    return best, best_fitness, stats
+
+
+def decode_course_file(raw):
+    """偵測編碼並解碼課程檔案，回傳 (文字, 編碼)"""
+    for encoding in COURSE_FILE_ENCODINGS:
+        try:
+            return raw.decode(encoding), encoding
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('utf-8', errors='replace'), 'utf-8 (部分字元無法辨識)'
+
+
+def map_course_columns(df):
+    """自動偵測欄位並對應到標準課程欄位，回傳 (對應後資料, 對應表, 缺少的必要欄位)"""
+    headers = {str(col).replace('\ufeff', '').replace(' ', '').strip(): col for col in df.columns}
+    mapping = {}
+    
+    # 先找完全相符的別名
+    for target, aliases in COURSE_COLUMN_ALIASES.items():
+        source = next((headers[a] for a in aliases if a in headers), None)
+        if source is not None and source not in mapping.values():
+            mapping[target] = source
+    
+    # 再找欄位名稱中包含別名者（如「科目名稱(中文)」）
+    for target, aliases in COURSE_COLUMN_ALIASES.items():
+        if target in mapping:
+            continue
+        source = next((col for name, col in headers.items()
+                       if col not in mapping.values() and any(a in name for a in aliases)), None)
+        if source is not None:
+            mapping[target] = source
+    
+    missing = [col for col in REQUIRED_COURSE_COLUMNS if col not in mapping]
+    
+    mapped = pd.DataFrame({target: df[source] for target, source in mapping.items()}, index=df.index)
+    for col, default in OPTIONAL_COURSE_COLUMNS.items():
+        if col not in mapped.columns:
+            mapped[col] = default
+    mapped = mapped.reindex(columns=COURSE_COLUMNS + [c for c in mapped.columns if c not in COURSE_COLUMNS])
+    
+    return mapped, mapping, missing
+
+
+def read_course_file(course_file):
+    """讀取單一課程檔案：解碼一次、解析並對應欄位"""
+    raw = course_file.getvalue() if hasattr(course_file, 'getvalue') else course_file.read()
+    report = {'檔案': course_file.name, '編碼': '', '筆數': 0, '欄位對應': '', '狀態': '✓', '說明': ''}
+    
+    try:
+        text, encoding = decode_course_file(raw)
+        report['編碼'] = encoding
+        df = pd.read_csv(StringIO(text))
+        df = df.dropna(how='all')
+        mapped, mapping, missing = map_course_columns(df)
+    except Exception as e:
+        report['狀態'] = '✗'
+        report['說明'] = f"無法讀取: {e}"
+        return None, report
+    
+    report['筆數'] = len(mapped)
+    report['欄位對應'] = ', '.join(f"{source}→{target}" if source != target else target
+                               for target, source in mapping.items())
+    if missing:
+        report['狀態'] = '✗'
+        report['說明'] = f"缺少必要欄位: {','.join(missing)}"
+        return None, report
+    
+    mapped['來源檔案'] = course_file.name
+    return mapped, report
+
+
+def load_course_files(course_files, max_workers=8):
+    """以執行緒池平行讀取多個課程檔案並合併，回傳 (合併資料, 各檔案報告)"""
+    if not course_files:
+        return pd.DataFrame(columns=COURSE_COLUMNS), []
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(course_files))) as executor:
+        parsed = list(executor.map(read_course_file, course_files))
+    
+    frames = [df for df, _ in parsed if df is not None]
+    reports = [report for _, report in parsed]
+    courses_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COURSE_COLUMNS)
+    
+    return courses_df, reports
+
+
+def load_room_file(room_file):
+    """讀取教室清單（CSV 或 XLSX），欄位為 教室、容量、設備（以 ; 分隔）"""
+    if room_file.name.lower().endswith('.xlsx'):
+        df = pd.read_excel(room_file)
+    else:
+        raw = room_file.getvalue() if hasattr(room_file, 'getvalue') else room_file.read()
+        df = pd.read_csv(StringIO(decode_course_file(raw)[0]))
+    
+    headers = {str(col).replace(' ', '').strip(): col for col in df.columns}
+    columns = {}
+    for target, aliases in ROOM_COLUMN_ALIASES.items():
+        source = next((headers[a] for a in aliases if a in headers), None)
+        if source is not None:
+            columns[target] = source
+    if '教室' not in columns:
+        raise ValueError("教室清單缺少「教室」欄位")
+    
+    rooms = []
+    for _, row in df.iterrows():
+        name = row[columns['教室']]
+        if pd.isna(name) or not str(name).strip():
+            continue
+        capacity = pd.to_numeric(row[columns['容量']], errors='coerce') if '容量' in columns else None
+        features = row[columns['設備']] if '設備' in columns else None
+        rooms.append({
+            '教室': str(name).strip(),
+            '容量': int(capacity) if capacity is not None and pd.notna(capacity) else 10 ** 6,
+            '設備': {f.strip() for f in str(features).split(';') if f.strip()} if pd.notna(features) else set()
+        })
+    return rooms
@@ -0,0 +1,511 @@
+'''
+本機排課服務：HTTP API + 有界工作佇列 + 多行程排課
+
+多個系辦同時排課時，由固定數量的工作行程輪流執行 CourseScheduler，
+優先分派執行中工作最少的來源（X-Client 標頭，預設為連線位址），相同時輪流分派，
+避免單一使用者佔滿所有工作行程。
+
+用法：python schedule_service.py [--host 127.0.0.1] [--port 8765] [--workers 2] [--queue-size 32]
+                                [--max-result-mb 512] [--result-ttl-hours 24]
+
+API：
+    POST /jobs               multipart/form-data 上傳 courses（可多個）、teachers（可多個）、rooms（選填），
+                             其餘欄位為排課參數（population_size、generations、adaptive、tournament_size、
+                             initializer、decompose、image_format（預設 svg）、soft_<限制名稱>）；回傳 202 與工作編號，
+                             佇列已滿時回傳 503
+    GET  /jobs/<編號>         工作狀態（queued / running / done / failed）與結果摘要
+    GET  /jobs/<編號>/result  結果ZIP（同介面上的「下載所有結果」）
+    GET  /                   服務狀態
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from schedule_engine import CourseScheduler, SOFT_CONSTRAINTS, load_course_files, load_room_file
+from timetable_export import TIMETABLE_EXPORT_FORMATS, create_zip_file
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # 單次上傳上限
+MAX_FINISHED_JOBS = 200              # 保留結果的已完成工作數
+MAX_RESULT_BYTES = 512 * 1024 * 1024  # 已完成工作結果ZIP的總大小上限
+RESULT_TTL = 24 * 3600               # 結果保留時間（秒）
+
+
+class QueueFull(Exception):
+    """工作佇列已滿"""
+
+
+def named_file(name, data):
+    """將上傳內容包裝為具有 name 屬性的檔案物件（與 Streamlit 上傳檔案相同介面）"""
+    f = BytesIO(data)
+    f.name = name
+    return f
+
+
+def parse_job_options(fields):
+    """驗證並轉換排課參數，不合法時拋出 ValueError"""
+    def integer(name, default, low, high):
+        try:
+            value = int(fields.get(name, default))
+        except ValueError:
+            raise ValueError(f"{name} 必須為整數")
+        if not low <= value <= high:
+            raise ValueError(f"{name} 必須介於 {low} 與 {high} 之間")
+        return value
+
+    def boolean(name, default):
+        return str(fields.get(name, default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+    options = {
+        'population_size': integer('population_size', 100, 10, 1000),
+        'generations': integer('generations', 200, 1, 2000),
+        'adaptive': boolean('adaptive', False),
+        'tournament_size': integer('tournament_size', 3, 2, 20),
+        'initializer': fields.get('initializer', 'dsatur'),
+        'decompose': boolean('decompose', True),
+        # 預設輸出 SVG：PNG 需在工作行程中以 matplotlib 逐班繪製
+        'image_format': fields.get('image_format', 'svg'),
+        'soft_constraints': {name: integer(f'soft_{name}', rule['weight'], 0, 100)
+                             for name, rule in SOFT_CONSTRAINTS.items()},
+    }
+    if options['initializer'] not in ('dsatur', 'random'):
+        raise ValueError("initializer 必須為 dsatur 或 random")
+    if options['image_format'] not in TIMETABLE_EXPORT_FORMATS:
+        raise ValueError(f"image_format 必須為 {'、'.join(TIMETABLE_EXPORT_FORMATS)} 之一")
+    return options
+
+
+def run_schedule_job(files, options):
+    """在工作行程中執行一個排課工作，回傳 (結果摘要, 結果ZIP位元組)"""
+    start = time.perf_counter()
+
+    courses_df, course_reports = load_course_files([named_file(*f) for f in files.get('courses', [])])
+    failed = [f"{r['檔案']}: {r['說明']}" for r in course_reports if r['狀態'] != '✓']
+    if failed:
+        raise ValueError(f"無法讀取課程檔案 {'；'.join(failed)}")
+    if not len(courses_df):
+        raise ValueError("沒有課程資料")
+
+    scheduler = CourseScheduler(courses_df, [named_file(*f) for f in files.get('teachers', [])],
+                                soft_constraints=options['soft_constraints'], verbose=False)
+    # 無法讀取的教師檔案會使該教師被視為全時段可用，直接讓工作失敗而非產生錯誤的課表
+    if scheduler.availability_errors:
+        raise ValueError(f"無法讀取教師可用時間檔案 {'；'.join(scheduler.availability_errors)}")
+    best_schedule, best_fitness = scheduler.solve(
+        population_size=options['population_size'],
+        generations=options['generations'],
+        adaptive=options['adaptive'],
+        tournament_size=options['tournament_size'],
+        initializer=options['initializer'],
+        decompose=options['decompose'],
+        max_workers=1  # 平行度由服務的工作行程數決定
+    )
+
+    room_unassigned = []
+    if files.get('rooms'):
+        rooms = load_room_file(named_file(*files['rooms'][0]))
+        best_schedule, room_unassigned = scheduler.assign_rooms(best_schedule, rooms)
+
+    results, unscheduled, _ = scheduler.generate_results(best_schedule)
+    conflicts = scheduler.check_conflicts(best_schedule)
+    zip_bytes = create_zip_file(results, unscheduled, conflicts,
+                                image_format=options['image_format']).getvalue()
+
+    summary = {
+        'best_fitness': float(best_fitness),
+        'scheduled': len([s for s in best_schedule if s.get('安排星期')]),
+        'unscheduled': scheduler.count_unscheduled(best_schedule),
+        'conflicts': len(conflicts),
+        'classes': len(results),
+        'room_unassigned': len(room_unassigned),
+        'availability_warnings': [f"{r['檔案']} / {r['工作表']}: {r['說明']}"
+                                  for r in scheduler.availability_report if r['狀態'] != '✓'],
+        'solve_seconds': round(time.perf_counter() - start, 2),
+    }
+    return summary, zip_bytes
+
+
+class JobQueue:
+    """有界工作佇列：依來源公平分派工作至行程池，同時執行的工作數不超過工作行程數"""
+
+    def __init__(self, workers=2, queue_size=32, max_result_bytes=MAX_RESULT_BYTES, result_ttl=RESULT_TTL):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_result_bytes = max_result_bytes
+        self.result_ttl = result_ttl
+        self.jobs = OrderedDict()   # 工作編號 → 工作紀錄（依提交順序）
+        self.pending = OrderedDict()  # 來源 → 等待中的工作編號
+        self.running_by_client = {}  # 來源 → 執行中的工作數
+        self.running = 0
+        self.retry = deque()     # 行程池異常時受影響、等待逐一單獨重新執行的工作
+        self.isolated = None     # 單獨重新執行中的工作編號
+        self.lock = threading.RLock()  # 工作已完成時 add_done_callback 會在分派中的執行緒內直接回呼
+        self.closed = False
+        self.executor = self.new_executor()
+
+    def new_executor(self):
+        # 以 spawn 啟動工作行程，避免在多執行緒的 HTTP 伺服器中 fork
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, client, files, options):
+        """加入工作並嘗試分派，回傳工作編號；等待中的工作已達上限時拋出 QueueFull"""
+        with self.lock:
+            if sum(len(ids) for ids in self.pending.values()) >= self.queue_size:
+                raise QueueFull()
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'id': job_id, 'client': client, 'status': 'queued', 'files': files, 'options': options,
+                'submitted': time.time(), 'started': None, 'finished': None,
+                'summary': None, 'error': None, 'result': None,
+            }
+            self.pending.setdefault(client, deque()).append(job_id)
+            self.dispatch()
+        return job_id
+
+    @staticmethod
+    def take_next(pending, running_by_client):
+        """取出下一個工作：優先分派給執行中工作最少的來源，相同時依來源輪替"""
+        client = min(pending, key=lambda c: running_by_client.get(c, 0))
+        ids = pending[client]
+        job_id = ids.popleft()
+        if ids:
+            pending.move_to_end(client)
+        else:
+            del pending[client]
+        running_by_client[client] = running_by_client.get(client, 0) + 1
+        return client, job_id
+
+    def queue_order(self):
+        """等待中工作的預計分派順序（等待重新執行的工作優先）"""
+        pending = OrderedDict((client, deque(ids)) for client, ids in self.pending.items())
+        running_by_client = dict(self.running_by_client)
+        return list(self.retry) + [self.take_next(pending, running_by_client)[1]
+                                   for _ in range(sum(map(len, pending.values())))]
+
+    def dispatch(self):
+        """有空閒的工作行程時分派等待中的工作（需持有 lock）
+
+        行程池異常時，同時執行的工作都會以 BrokenProcessPool 結束，無法得知是哪個工作造成；
+        這些工作會等執行中的工作結束後逐一單獨重新執行，單獨執行仍使行程池異常者才判定失敗。
+        """
+        while not self.closed and self.running < self.workers and self.isolated is None:
+            if self.retry:
+                if self.running:
+                    break
+                job_id = self.retry.popleft()
+                client = self.jobs[job_id]['client']
+                self.running_by_client[client] = self.running_by_client.get(client, 0) + 1
+                self.isolated = job_id
+            elif self.pending:
+                client, job_id = self.take_next(self.pending, self.running_by_client)
+            else:
+                break
+
+            job = self.jobs[job_id]
+            job['status'] = 'running'
+            job['started'] = time.time()
+            executor = self.executor
+            try:
+                future = executor.submit(run_schedule_job, job['files'], job['options'])
+            except BrokenProcessPool:
+                # 行程池已損壞但尚未收到結束回呼：重建後將工作放回原位置
+                job['status'], job['started'] = 'queued', None
+                self.release(client)
+                if self.isolated == job_id:
+                    self.isolated = None
+                    self.retry.appendleft(job_id)
+                else:
+                    self.pending.setdefault(client, deque()).appendleft(job_id)
+                    self.pending.move_to_end(client, last=False)
+                self.executor = self.new_executor()
+                continue
+            self.running += 1
+            future.add_done_callback(
+                lambda f, job_id=job_id, executor=executor: self.finish(job_id, f, executor))
+
+    def release(self, client):
+        self.running_by_client[client] -= 1
+        if not self.running_by_client[client]:
+            del self.running_by_client[client]
+
+    def finish(self, job_id, future, executor):
+        with self.lock:
+            self.running -= 1
+            job = self.jobs[job_id]
+            self.release(job['client'])
+            isolated = self.isolated == job_id
+            if isolated:
+                self.isolated = None
+            try:
+                job['summary'], job['result'] = future.result()
+                job['status'] = 'done'
+            except BrokenProcessPool as e:
+                # 工作行程異常結束時重建行程池（同一行程池的其他工作也會收到此例外）
+                if executor is self.executor and not self.closed:
+                    self.executor = self.new_executor()
+                if self.closed:
+                    job['status'], job['error'] = 'failed', "排課服務已停止"
+                elif isolated:
+                    job['status'], job['error'] = 'failed', f"工作行程異常結束（單獨重新執行仍失敗）: {e}"
+                else:
+                    job['status'], job['started'] = 'queued', None
+                    self.retry.append(job_id)
+                    self.dispatch()
+                    return
+            except Exception as e:
+                job['status'], job['error'] = 'failed', str(e)
+
+            job['finished'] = time.time()
+            job.pop('files', None)
+
+            self.evict()
+            self.dispatch()
+
+    def evict(self):
+        """刪除超過保留時間的已完成工作；數量或結果總大小超過上限時由最早完成者開始刪除（需持有 lock）"""
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job['status'] in ('done', 'failed')),
+                          key=lambda job: job['finished'])
+        total = sum(len(job['result'] or b'') for job in finished)
+        count = len(finished)
+        for job in finished:
+            if (now - job['finished'] <= self.result_ttl and total <= self.max_result_bytes
+                    and count <= MAX_FINISHED_JOBS):
+                break
+            del self.jobs[job['id']]
+            total -= len(job['result'] or b'')
+            count -= 1
+
+    def status(self, job_id):
+        """工作狀態（不含結果檔案），找不到工作時回傳 None"""
+        with self.lock:
+            self.evict()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            info = {key: job[key] for key in ('id', 'status', 'submitted', 'started', 'finished',
+                                              'summary', 'error')}
+            if job['status'] == 'queued':
+                info['queue_position'] = self.queue_order().index(job_id)
+            return info
+
+    def result(self, job_id):
+        with self.lock:
+            self.evict()
+            job = self.jobs.get(job_id)
+            return job['result'] if job else None
+
+    def overview(self):
+        with self.lock:
+            self.evict()
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'queued': sum(len(ids) for ids in self.pending.values()) + len(self.retry),
+                'queue_size': self.queue_size,
+                'queued_by_client': {client: len(ids) for client, ids in self.pending.items()},
+                'stored_results': sum(1 for job in self.jobs.values() if job['result'] is not None),
+                'stored_result_bytes': sum(len(job['result'] or b'') for job in self.jobs.values()),
+            }
+
+    def shutdown(self):
+        """停止服務：取消等待中的工作並結束所有工作行程（包含執行中的工作），避免留下孤兒行程"""
+        with self.lock:
+            self.closed = True
+            executor = self.executor
+            # ProcessPoolExecutor 沒有公開終止工作行程的方法，直接取得其行程
+            processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+
+def parse_multipart(content_type, body):
+    """解析 multipart/form-data，回傳 (一般欄位, {欄位: [(檔名, 內容), ...]})"""
+    message = BytesParser(policy=policy.default).parsebytes(
+        b'MIME-Version: 1.0\r\nContent-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    if not message.is_multipart():
+        raise ValueError("需以 multipart/form-data 上傳")
+
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b''
+        if filename:
+            # 未依 RFC 2231 編碼的 UTF-8 檔名（如 curl）會以 surrogateescape 保留原始位元組
+            filename = filename.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+            files.setdefault(name, []).append((os.path.basename(filename), payload))
+        elif name:
+            fields[name] = payload.decode('utf-8')
+    return fields, files
+
+
+class ScheduleRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ScheduleService/1.0'
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': '找不到路徑'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_UPLOAD_BYTES:
+            return self.send_json(413, {'error': f"上傳檔案超過 {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"})
+
+        try:
+            fields, files = parse_multipart(self.headers.get('Content-Type', ''), self.rfile.read(length))
+            if not files.get('courses') or not files.get('teachers'):
+                raise ValueError("需上傳 courses 與 teachers 檔案")
+            options = parse_job_options(fields)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        client = self.headers.get('X-Client') or self.client_address[0]
+        try:
+            job_id = self.server.queue.submit(client, files, options)
+        except QueueFull:
+            return self.send_json(503, {'error': '工作佇列已滿，請稍後再試'}, {'Retry-After': '10'})
+
+        self.send_json(202, {'job_id': job_id, 'status_url': f'/jobs/{job_id}',
+                             'result_url': f'/jobs/{job_id}/result'})
+
+    def do_GET(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+
+        if not parts:
+            return self.send_json(200, self.server.queue.overview())
+
+        if parts[0] != 'jobs' or len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] != 'result'):
+            return self.send_json(404, {'error': '找不到路徑'})
+
+        status = self.server.queue.status(parts[1])
+        if status is None:
+            return self.send_json(404, {'error': '找不到工作'})
+        if len(parts) == 2:
+            return self.send_json(200, status)
+
+        result = self.server.queue.result(parts[1])
+        if result is None:
+            return self.send_json(409, {'error': f"工作尚未完成（{status['status']}）", 'status': status['status']})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', "attachment; filename*=UTF-8''" + urllib.parse.quote('排課結果.zip'))
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+
+class ScheduleServiceClient:
+    """排課服務的 HTTP 用戶端（Streamlit 介面以此送出工作並取回結果）"""
+
+    def __init__(self, base_url, client_id=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.client_id = client_id
+        self.timeout = timeout
+
+    def request(self, path, data=None, headers=None):
+        headers = dict(headers or {})
+        if self.client_id:
+            headers['X-Client'] = self.client_id
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8'))['error']
+            except Exception:
+                message = e.reason
+            raise RuntimeError(f"排課服務回應錯誤（{e.code}）: {message}")
+
+    def submit(self, course_files, teacher_files, room_file=None, options=None):
+        """送出排課工作，檔案為 (檔名, 內容) 列表，回傳工作編號"""
+        boundary = uuid.uuid4().hex
+        chunks = []
+        for name, value in (options or {}).items():
+            chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                          f'{value}\r\n'.encode('utf-8'))
+        files = [('courses', f) for f in course_files] + [('teachers', f) for f in teacher_files]
+        if room_file:
+            files.append(('rooms', room_file))
+        for field, (filename, content) in files:
+            chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                          f"filename*=UTF-8''{urllib.parse.quote(filename)}\r\n"
+                          f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + content + b'\r\n')
+        chunks.append(f'--{boundary}--\r\n'.encode('utf-8'))
+
+        response = self.request('/jobs', b''.join(chunks),
+                                {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        return json.loads(response)['job_id']
+
+    def status(self, job_id):
+        return json.loads(self.request(f'/jobs/{job_id}'))
+
+    def result(self, job_id):
+        return self.request(f'/jobs/{job_id}/result')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本機排課服務')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='同時執行排課的工作行程數')
+    parser.add_argument('--queue-size', type=int, default=32, help='等待中工作的上限')
+    parser.add_argument('--max-result-mb', type=int, default=MAX_RESULT_BYTES // (1024 * 1024),
+                        help='保留於記憶體的結果ZIP總大小上限（MB）')
+    parser.add_argument('--result-ttl-hours', type=float, default=RESULT_TTL / 3600,
+                        help='已完成工作的結果保留時間（小時）')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), ScheduleRequestHandler)
+    server.queue = JobQueue(workers=args.workers, queue_size=args.queue_size,
+                            max_result_bytes=args.max_result_mb * 1024 * 1024,
+                            result_ttl=args.result_ttl_hours * 3600)
+    print(f"排課服務已啟動：http://{args.host}:{args.port}（工作行程 {args.workers} 個，佇列上限 {args.queue_size}）")
+
+    def stop(signum, frame):
+        # serve_forever 在主執行緒執行，shutdown 必須由其他執行緒呼叫
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    # systemd / docker stop 以 SIGTERM 停止服務
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
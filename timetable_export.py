@@ -0,0 +1,401 @@
+"""
+課表輸出：HTML / SVG / PNG 課表與 ZIP、XLSX 打包
+
+matplotlib 只在實際繪製 PNG 時才載入，字型查詢結果會快取；不依賴 Streamlit，
+警告訊息寫入 logging 或呼叫端傳入的 reporter（介面同 st.warning）
+"""
+
+import logging
+import pandas as pd
+import zipfile
+from functools import lru_cache
+from html import escape
+from io import BytesIO
+
+logger = logging.getLogger('timetable_export')
+
+# 課表方格的節次、時間與星期
+TIMETABLE_PERIODS = ["1", "2", "3", "4", "E", "5", "6", "7", "8", "9"]
+TIMETABLE_PERIOD_TIME = {
+    "1": "08:10-09:00", "2": "09:10-10:00", "3": "10:10-11:00",
+    "4": "11:10-12:00", "E": "12:10-13:00", "5": "13:10-14:00",
+    "6": "14:10-15:00", "7": "15:10-16:00", "8": "16:10-17:00",
+    "9": "17:10-18:00"
+}
+TIMETABLE_DAYS = ["星期一", "星期二", "星期三", "星期四", "星期五"]
+
+
+def timetable_grid(df):
+    """將班級課表資料轉為 節次 × 星期 的文字方格"""
+    # 星期轉換對照表
+    day_map = {
+        "一": "星期一", "二": "星期二", "三": "星期三",
+        "四": "星期四", "五": "星期五", "六": "星期六", "日": "星期日"
+    }
+    
+    # 創建副本並轉換星期
+    df_copy = df.copy()
+    df_copy["安排星期"] = df_copy["安排星期"].map(day_map)
+    
+    # 初始化課表
+    timetable = pd.DataFrame("", index=TIMETABLE_PERIODS, columns=TIMETABLE_DAYS)
+    
+    # 填入課程資料
+    for _, row in df_copy.iterrows():
+        day = row["安排星期"]
+        if pd.isna(day) or day not in timetable.columns:
+            continue
+            
+        subject = str(row["科目名稱"])
+        teacher = row.get("授課教師", "")
+        text = f"{subject}\n{teacher}" if pd.notna(teacher) and teacher.strip() and teacher != "無" else subject
+        room = row.get("教室", "")
+        if pd.notna(room) and str(room).strip():
+            text += f"\n@{room}"
+        
+        # 解析節數
+        periods_list = [p.strip() for p in str(row["安排節數"]).split(";") if p.strip()]
+        
+        for p in periods_list:
+            if p in timetable.index:
+                if timetable.at[p, day] == "":
+                    timetable.at[p, day] = text
+                else:
+                    timetable.at[p, day] += "\n" + text
+    
+    return timetable
+
+
+# 依序嘗試的中文字型，使用第一個已安裝的字型
+PNG_FONT_CANDIDATES = ['Microsoft JhengHei', 'Noto Sans CJK TC', 'Noto Sans TC', 'PingFang TC', 'WenQuanYi Zen Hei']
+
+
+@lru_cache(maxsize=None)
+def load_pyplot():
+    """首次繪圖時才載入 matplotlib，並只查詢一次可用的中文字型"""
+    import matplotlib
+    matplotlib.use('Agg')  # 使用非互動式後端
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+    
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    fonts = [name for name in PNG_FONT_CANDIDATES if name in installed]
+    plt.rcParams['font.family'] = fonts + ['sans-serif']  # 支援中文
+    return plt
+
+
+def create_timetable_image(df, class_name):
+    """為單一班級創建課表圖片"""
+    period_order = TIMETABLE_PERIODS
+    period_time = TIMETABLE_PERIOD_TIME
+    days = TIMETABLE_DAYS
+    
+    plt = load_pyplot()
+    timetable = timetable_grid(df)
+    
+    # 節次標籤
+    row_labels = [f"{p}節\n{period_time[p]}" for p in period_order]
+    
+    # 繪製課表
+    fig, ax = plt.subplots(figsize=(14, 10))
+    ax.axis("off")
+    
+    table = ax.table(
+        cellText=timetable.values,
+        rowLabels=row_labels,
+        colLabels=timetable.columns,
+        cellLoc="center",
+        loc="center"
+    )
+    
+    table.auto_set_font_size(False)
+    table.set_fontsize(8)
+    table.scale(1.2, 2.5)
+    
+    # 使用更安全的方式設定表格樣式
+    try:
+        # 獲取所有單元格
+        cells = table.get_celld()
+        
+        # 設定標題行（第0行）
+        for col in range(-1, len(days)):
+            if (0, col) in cells:
+                cell = cells[(0, col)]
+                if col == -1:
+                    cell.set_facecolor('#D9E1F2')
+                    cell.set_text_props(weight='bold')
+                else:
+                    cell.set_facecolor('#4472C4')
+                    cell.set_text_props(weight='bold', color='white')
+                cell.set_edgecolor('#666666')
+                cell.set_linewidth(1.5)
+        
+        # 設定資料行
+        for row in range(1, len(period_order) + 1):
+            for col in range(-1, len(days)):
+                if (row, col) in cells:
+                    cell = cells[(row, col)]
+                    if col == -1:
+                        # 節次標籤列
+                        cell.set_facecolor('#D9E1F2')
+                        cell.set_text_props(weight='bold', size=7)
+                    else:
+                        # 內容格
+                        cell.set_facecolor('#FFFFFF')
+                        cell.set_text_props(size=8)
+                    cell.set_edgecolor('#CCCCCC')
+                    cell.set_linewidth(1)
+    
+    except Exception as e:
+        logger.warning(f"設定表格樣式時發生警告: {e}")
+    
+    plt.title(f"{class_name} 班級課表", fontsize=18, pad=25, weight='bold')
+    
+    # 儲存到 BytesIO
+    img_buffer = BytesIO()
+    plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
+    plt.close(fig)
+    img_buffer.seek(0)
+    
+    return img_buffer
+
+
+# HTML / SVG 課表樣板（字型交由瀏覽器挑選，不依賴伺服器安裝的字型）
+TIMETABLE_FONTS = "'Microsoft JhengHei', 'PingFang TC', 'Noto Sans CJK TC', 'Noto Sans TC', sans-serif"
+
+TIMETABLE_HTML_STYLE = """<style>
+.tt-wrap {{ font-family: {fonts}; color: #222; }}
+.tt-title {{ text-align: center; font-size: 1.4em; font-weight: bold; margin: 0.4em 0 0.8em; }}
+.tt-table {{ border-collapse: collapse; width: 100%; table-layout: fixed; }}
+.tt-table th, .tt-table td {{ border: 1px solid #CCCCCC; text-align: center; vertical-align: middle;
+    padding: 4px; font-size: 0.85em; white-space: pre-line; height: 3.2em; }}
+.tt-table thead th {{ background: #4472C4; color: white; border-color: #666666; }}
+.tt-table th.tt-period {{ background: #D9E1F2; font-size: 0.75em; width: 7.5em; }}
+.tt-table td.tt-filled {{ background: #F2F6FC; }}
+</style>"""
+
+TIMETABLE_HTML_TABLE = """<div class="tt-wrap">
+<div class="tt-title">{title}</div>
+<table class="tt-table">
+<thead><tr><th class="tt-period">節次</th>{day_headers}</tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</div>"""
+
+TIMETABLE_HTML_PAGE = """<!DOCTYPE html>
+<html lang="zh-Hant">
+<head><meta charset="utf-8"><title>{title}</title>{style}</head>
+<body>{table}</body>
+</html>"""
+
+
+def create_timetable_html(df, class_name, standalone=True):
+    """以 HTML 表格呈現班級課表；standalone=True 時產生可獨立開啟的完整網頁"""
+    timetable = timetable_grid(df)
+    
+    rows = []
+    for period in TIMETABLE_PERIODS:
+        cells = ''.join(
+            f'<td class="tt-filled">{escape(text)}</td>' if text else '<td></td>'
+            for text in timetable.loc[period]
+        )
+        rows.append(f'<tr><th class="tt-period">{period}節\n{TIMETABLE_PERIOD_TIME[period]}</th>{cells}</tr>')
+    
+    title = f"{class_name} 班級課表"
+    table = TIMETABLE_HTML_TABLE.format(
+        title=escape(title),
+        day_headers=''.join(f'<th>{day}</th>' for day in TIMETABLE_DAYS),
+        rows='\n'.join(rows)
+    )
+    style = TIMETABLE_HTML_STYLE.format(fonts=TIMETABLE_FONTS)
+    
+    if not standalone:
+        return style + table
+    return TIMETABLE_HTML_PAGE.format(title=escape(title), style=style, table=table)
+
+
+def create_timetable_svg(df, class_name):
+    """以 SVG 向量圖呈現班級課表"""
+    timetable = timetable_grid(df)
+    
+    label_width, day_width, header_height, title_height, line_height = 110, 170, 36, 50, 16
+    width = label_width + day_width * len(TIMETABLE_DAYS)
+    
+    row_heights = []
+    for period in TIMETABLE_PERIODS:
+        lines = max([text.count('\n') + 1 for text in timetable.loc[period] if text] or [1])
+        row_heights.append(max(48, lines * line_height + 14))
+    height = title_height + header_height + sum(row_heights)
+    
+    def cell(x, y, w, h, text, fill, stroke='#CCCCCC', color='#222', weight='normal', size=12):
+        lines = text.split('\n') if text else []
+        first_dy = -(len(lines) - 1) * line_height / 2
+        tspans = ''.join(
+            f'<tspan x="{x + w / 2}" dy="{first_dy if i == 0 else line_height}">{escape(line)}</tspan>'
+            for i, line in enumerate(lines)
+        )
+        return (f'<rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{fill}" stroke="{stroke}"/>'
+                f'<text x="{x + w / 2}" y="{y + h / 2}" fill="{color}" font-weight="{weight}" '
+                f'font-size="{size}" text-anchor="middle" dominant-baseline="central">{tspans}</text>')
+    
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{TIMETABLE_FONTS}">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{width / 2}" y="{title_height / 2}" font-size="20" font-weight="bold" '
+        f'text-anchor="middle" dominant-baseline="central">{escape(class_name)} 班級課表</text>',
+    ]
+    
+    y = title_height
+    parts.append(cell(0, y, label_width, header_height, '節次', '#D9E1F2', '#666666', weight='bold'))
+    for i, day in enumerate(TIMETABLE_DAYS):
+        parts.append(cell(label_width + i * day_width, y, day_width, header_height, day,
+                          '#4472C4', '#666666', color='white', weight='bold', size=13))
+    y += header_height
+    
+    for period, row_height in zip(TIMETABLE_PERIODS, row_heights):
+        parts.append(cell(0, y, label_width, row_height, f"{period}節\n{TIMETABLE_PERIOD_TIME[period]}",
+                          '#D9E1F2', weight='bold', size=11))
+        for i, text in enumerate(timetable.loc[period]):
+            parts.append(cell(label_width + i * day_width, y, day_width, row_height, text,
+                              '#F2F6FC' if text else '#FFFFFF'))
+        y += row_height
+    
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+TIMETABLE_EXPORT_FORMATS = {
+    'png': ('PNG 圖片', 'png', lambda df, name: create_timetable_image(df, name).getvalue()),
+    'svg': ('SVG 向量圖', 'svg', lambda df, name: create_timetable_svg(df, name).encode('utf-8')),
+    'html': ('HTML 網頁', 'html', lambda df, name: create_timetable_html(df, name).encode('utf-8')),
+}
+
+
+def create_zip_file(results, unscheduled, conflicts, images=None, image_format='png', reporter=None):
+    """創建包含所有結果的ZIP檔案（包含CSV和課表圖）
+    
+    image_format 為 'png'、'svg' 或 'html'；
+    images 為 {班級: PNG位元組} 的快取，已有的圖片不重新繪製，新繪製的圖片會存回快取；
+    reporter 為警告訊息的輸出（如 st），未指定時寫入 logging
+    """
+    if images is None:
+        images = {}
+    _, extension, render = TIMETABLE_EXPORT_FORMATS[image_format]
+
+    zip_buffer = BytesIO()
+    
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        # 寫入各班級課表（CSV）
+        for class_name, df in results.items():
+            csv_buffer = BytesIO()
+            df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
+            zip_file.writestr(f'{class_name}課程排課結果.csv', csv_buffer.getvalue())
+            
+            # 寫入課表圖
+            try:
+                if image_format != 'png':
+                    zip_file.writestr(f'{class_name}_課表.{extension}', render(df, class_name))
+                    continue
+                if class_name not in images:
+                    images[class_name] = render(df, class_name)
+                zip_file.writestr(f'{class_name}_課表.png', images[class_name])
+            except Exception as e:
+                (reporter or logger).warning(f"生成 {class_name} 課表圖片時發生錯誤: {e}")
+        
+        # 寫入未排課程
+        if unscheduled:
+            df_unscheduled = pd.DataFrame(unscheduled)
+            csv_buffer = BytesIO()
+            df_unscheduled.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
+            zip_file.writestr('未排課程.csv', csv_buffer.getvalue())
+        
+        # 寫入衝突報告
+        if conflicts:
+            df_conflicts = pd.DataFrame(conflicts)
+            csv_buffer = BytesIO()
+            df_conflicts.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
+            zip_file.writestr('衝突報告.csv', csv_buffer.getvalue())
+    
+    zip_buffer.seek(0)
+    return zip_buffer
+
+
+def xlsx_sheet_name(name, used):
+    """轉為合法且不重複的工作表名稱（最多31字元，不含 []:*?/\\）"""
+    base = ''.join('_' if ch in '[]:*?/\\' else ch for ch in str(name))[:31] or '工作表'
+    sheet_name, n = base, 1
+    while sheet_name.lower() in used:
+        n += 1
+        suffix = f"({n})"
+        sheet_name = base[:31 - len(suffix)] + suffix
+    used.add(sheet_name.lower())
+    return sheet_name
+
+
+def create_xlsx_file(results, unscheduled, conflicts):
+    """以 xlsxwriter constant_memory 模式逐列寫出單一活頁簿
+    
+    每個班級一個工作表（星期 × 節次課表方格，下方附課程明細），另含未排課程與衝突報告
+    """
+    xlsx_buffer = BytesIO()
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(xlsx_buffer, {'constant_memory': True})
+    
+    title_format = workbook.add_format({'bold': True, 'font_size': 14})
+    header_format = workbook.add_format({
+        'bold': True, 'font_color': 'white', 'bg_color': '#4472C4',
+        'align': 'center', 'valign': 'vcenter', 'border': 1, 'border_color': '#666666'
+    })
+    label_format = workbook.add_format({
+        'bold': True, 'bg_color': '#D9E1F2', 'align': 'center', 'valign': 'vcenter',
+        'text_wrap': True, 'border': 1, 'border_color': '#CCCCCC'
+    })
+    cell_format = workbook.add_format({
+        'align': 'center', 'valign': 'vcenter', 'text_wrap': True,
+        'border': 1, 'border_color': '#CCCCCC'
+    })
+    
+    def write_table(worksheet, row, df):
+        """逐列寫出表格，回傳下一個可用列號"""
+        worksheet.write_row(row, 0, [str(c) for c in df.columns], header_format)
+        for values in df.itertuples(index=False):
+            row += 1
+            worksheet.write_row(row, 0, ['' if pd.isna(v) else v for v in values])
+        return row + 1
+    
+    used_names = set()
+    
+    for class_name, df in results.items():
+        worksheet = workbook.add_worksheet(xlsx_sheet_name(class_name, used_names))
+        worksheet.set_column(0, 0, 14)
+        worksheet.set_column(1, len(TIMETABLE_DAYS), 22)
+        
+        worksheet.write(0, 0, f"{class_name} 班級課表", title_format)
+        worksheet.write_row(1, 0, ['節次'] + TIMETABLE_DAYS, header_format)
+        
+        timetable = timetable_grid(df)
+        for i, period in enumerate(TIMETABLE_PERIODS):
+            row = i + 2
+            cells = timetable.loc[period].tolist()
+            lines = max([c.count('\n') + 1 for c in cells if c] or [1])
+            worksheet.set_row(row, max(30, 15 * lines))
+            worksheet.write(row, 0, f"{period}節\n{TIMETABLE_PERIOD_TIME[period]}", label_format)
+            worksheet.write_row(row, 1, cells, cell_format)
+        
+        write_table(worksheet, len(TIMETABLE_PERIODS) + 3, df)
+    
+    for sheet_title, rows in (('未排課程', unscheduled), ('衝突報告', conflicts)):
+        worksheet = workbook.add_worksheet(xlsx_sheet_name(sheet_title, used_names))
+        if rows:
+            df = pd.DataFrame(rows)
+            worksheet.set_column(0, len(df.columns) - 1, 18)
+            write_table(worksheet, 0, df)
+        else:
+            worksheet.write(0, 0, f"無{sheet_title}")
+    
+    workbook.close()
+    xlsx_buffer.seek(0)
+    return xlsx_buffer